@@ -0,0 +1,63 @@
+"""
+Benchmark of next release date computation
+
+Compares legacy week by week loop of Updater.find_next with closed-form
+next_release and vectorised next_releases on random series library,
+results of all three are checked to be equal for weekly series.
+
+    python benchmarks/bench_release_dates.py --sizes 1000 10000 100000 --years 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'serials_notifier')]
+
+from notion_series_db import Series  # noqa: E402
+from release_dates import next_release, next_releases  # noqa: E402
+
+
+def legacy_find_next(date_started: datetime) -> datetime:
+    tmp = date_started.date()
+    while (tmp < datetime.today().date()):
+        tmp += timedelta(days=7)
+    return datetime.combine(tmp, datetime.min.time())
+
+
+def make_library(size: int, years: int) -> list:
+    rng = random.Random(size)
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    return [Series(f"serie-{i}", f"Сериал {i}", "Смотрю",
+                   date_release=today - timedelta(days=rng.randrange(365 * years)))
+            for i in range(size)]
+
+
+def timed_ms(func) -> tuple:
+    start = time.perf_counter()
+    res = func()
+    return round((time.perf_counter() - start) * 1000, 2), res
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--years', type=int, default=10, help='max age of release dates')
+    args = parser.parse_args()
+
+    today = datetime.today().date()
+    print(f"{'size':>7} {'loop ms':>10} {'closed ms':>10} {'batch ms':>10}")
+    for size in args.sizes:
+        series = make_library(size, args.years)
+        loop_ms, loop = timed_ms(lambda: [legacy_find_next(el.date_release) for el in series])
+        closed_ms, closed = timed_ms(lambda: [next_release(el.date_release, today) for el in series])
+        batch_ms, batch = timed_ms(lambda: next_releases(series, today))
+        assert loop == closed == batch, "next release dates differ"
+        print(f"{size:>7} {loop_ms:>10} {closed_ms:>10} {batch_ms:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark of fuzzy series name index
+
+Builds SeriesIndex over synthetic titles, applies incremental update as after
+delta sync and measures search latency of prefixes, whole names and names with
+one typo, and share of typo queries which find their series in top 5.
+
+    python benchmarks/bench_series_index.py --sizes 10000 30000 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'serials_notifier')]
+
+from notion_series_db import Series  # noqa: E402
+from series_index import SeriesIndex  # noqa: E402
+
+
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+
+
+def make_vocabulary(n: int, rnd: random.Random) -> list:
+    return [''.join(rnd.choice(LETTERS) for _ in range(rnd.randint(3, 10))) for _ in range(n)]
+
+
+def make_titles(n: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    words = make_vocabulary(max(n // 5, 100), rnd)
+    return [' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 4))).capitalize() for _ in range(n)]
+
+
+def typo(text: str, rnd: random.Random) -> str:
+    i = rnd.randrange(len(text))
+    return text[:i] + rnd.choice(LETTERS) + text[i + 1:]
+
+
+def measure(index: SeriesIndex, queries: list) -> dict:
+    times = list()
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"median_ms": round(statistics.median(times), 3), "p99_ms": round(times[int(len(times) * 0.99)], 3)}
+
+
+def run_size(size: int, args: argparse.Namespace) -> list:
+    rnd = random.Random(args.seed)
+    titles = make_titles(size, args.seed)
+    series = [Series(f"serie-{i:06d}", name, 'Смотрю', season=1) for i, name in enumerate(titles)]
+
+    index = SeriesIndex()
+    start = time.perf_counter()
+    index.load(series)
+    build = (time.perf_counter() - start) * 1000
+
+    changed = [Series(el._id, typo(el.name, rnd), el.status, season=2) for el in rnd.sample(series, 100)]
+    start = time.perf_counter()
+    index.update(changed)
+    update = (time.perf_counter() - start) * 1000
+    index.update([series[int(el._id[-6:])] for el in changed])
+
+    sample = rnd.sample(series, args.queries)
+    queries = {
+        'prefix': [el.name[:rnd.randint(2, 5)] for el in sample],
+        'name': [el.name for el in sample],
+        'typo': [typo(el.name, rnd) for el in sample],
+    }
+    rows = [{"size": size, "step": "load", "ms": round(build, 1)},
+            {"size": size, "step": "update 100", "ms": round(update, 2)}]
+    for name, batch in queries.items():
+        rows.append({"size": size, "step": f"search {name}", **measure(index, batch)})
+
+    found = sum(el in index.search(query, 5) for el, query in zip(sample, queries['typo']))
+    rows.append({"size": size, "step": "typo recall@5", "ms": round(found / len(sample), 3)})
+    return rows
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"{'size':>6} {'step':<15} {'ms':>8} {'median ms':>10} {'p99 ms':>8}")
+    for size in args.sizes:
+        for row in run_size(size, args):
+            print(f"{row['size']:>6} {row['step']:<15} {row.get('ms', ''):>8} "
+                  f"{row.get('median_ms', ''):>10} {row.get('p99_ms', ''):>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 30000, 50000])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,158 @@
+"""
+Offline benchmark of host startup
+
+Measures import of bot.py and app.py without any environment, host creation by
+factory, and time until /healthz and /readyz answer 200 on first start with empty
+mongo and on restart over data of first start. Host runs both plugins against local
+FakeNotion, fake telegram bot api and in-memory mongo (mongomock-motor) or local
+mongo if CON_STRING is set. mongomock runs queries on event loop, so background
+sync delays probes, use local mongo for numbers comparable with production.
+
+    python benchmarks/bench_startup.py --sizes 100 1000 --latency 0.01
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'serials_notifier'),
+         os.path.join(ROOT, 'subscriptions_notifier')]
+sys.path[:0] = PATHS
+
+import httpx  # noqa: E402
+from aiohttp import web  # noqa: E402
+from bench_sync import mongo_client  # noqa: E402
+from fake_notion import FakeNotion, make_series, make_subscriptions  # noqa: E402
+from host import create_host  # noqa: E402
+from series_plugin import SeriesPlugin  # noqa: E402
+from subs_plugin import SubsPlugin  # noqa: E402
+
+
+SERIES_DB = 'series-db'
+SUBS_DB = 'subs-db'
+BOT_TOKEN = '123:bench'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_imports() -> float:
+    """
+    Imports entrypoints in clean interpreter without environment
+
+    Returns:
+        float: import time in ms
+    """
+    code = ("import sys, time; sys.path[:0] = %r; start = time.perf_counter(); "
+            "import bot, app; print((time.perf_counter() - start) * 1000)") % PATHS
+    out = subprocess.run([sys.executable, '-c', code], env={'PATH': os.environ.get('PATH', '')},
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+
+async def start_fake_telegram() -> web.AppRunner:
+    async def get_me(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True,
+                                                         "first_name": "bench", "username": "bench_bot"}})
+
+    app = web.Application()
+    app.router.add_route('*', f'/bot{BOT_TOKEN}/getMe', get_me)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    return runner
+
+
+async def wait_for(client: httpx.AsyncClient, url: str, start: float) -> float:
+    while True:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return (time.perf_counter() - start) * 1000
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.005)
+
+
+async def start_host(env: dict, mongo, start: float) -> dict:
+    """
+    Starts host, waits until it is alive and ready and stops it
+
+    Returns:
+        dict: milliseconds since start of each step
+    """
+    host = create_host([SeriesPlugin, SubsPlugin], env, mongo_client=mongo)
+    created = (time.perf_counter() - start) * 1000
+    await host.on_startup()
+    started = (time.perf_counter() - start) * 1000
+    url = f"http://127.0.0.1:{env['HEALTH_PORT']}"
+    async with httpx.AsyncClient() as client:
+        alive, ready = await asyncio.gather(wait_for(client, f'{url}/healthz', start),
+                                            wait_for(client, f'{url}/readyz', start))
+    # sync left running after ready finishes before restart
+    await host._warm_up
+    series_sync = host.plugins[0].tenants.default.sync_runner
+    if series_sync.running:
+        await series_sync.trigger()
+    await host.on_shutdown()
+    await (await host.bot.get_session()).close()
+    return {"create_ms": round(created, 1), "startup_ms": round(started, 1),
+            "alive_ms": round(alive, 1), "ready_ms": round(ready, 1)}
+
+
+async def run_size(size: int, args: argparse.Namespace) -> list:
+    fake = FakeNotion(latency=args.latency)
+    fake.add_database(SERIES_DB, make_series(size))
+    fake.add_database(SUBS_DB, make_subscriptions(max(size // 10, 1)))
+    os.environ['NOTION_URL'] = await fake.start()
+    os.environ['NOTION_RATE'] = str(args.rate)
+
+    telegram = await start_fake_telegram()
+    telegram_port = free_port()
+    await web.TCPSite(telegram, '127.0.0.1', telegram_port).start()
+
+    mongo = mongo_client()
+    for name in ('series', 'sync_state', 'calendar'):
+        await mongo.series[name].delete_many({})
+
+    env = {'API_SECRET': 'fake', 'BOT_TOKEN': BOT_TOKEN, 'MY_ID': '1', 'SERIES_ID': SERIES_DB,
+           'SUBS_ID': SUBS_DB, 'METRICS_PORT': '', 'HEALTH_PORT': str(free_port()), 'RUN_JOBS': '0',
+           'TELEGRAM_API_URL': f'http://127.0.0.1:{telegram_port}', 'STATE_DIR': tempfile.mkdtemp()}
+
+    rows = list()
+    for run in ('first start', 'restart'):
+        requests_before = fake.total_requests
+        row = await start_host(env, mongo, time.perf_counter())
+        rows.append({"size": size, "run": run, **row, "requests": fake.total_requests - requests_before})
+
+    await telegram.cleanup()
+    await fake.stop()
+    return rows
+
+
+async def main(args: argparse.Namespace) -> None:
+    logging.disable(logging.WARNING)
+    print(f"import bot, app without environment: {measure_imports():.1f} ms")
+    print(f"{'size':>6} {'run':<12} {'create ms':>10} {'startup ms':>11} {'alive ms':>9} "
+          f"{'ready ms':>9} {'requests':>9}")
+    for size in args.sizes:
+        for row in await run_size(size, args):
+            print(f"{row['size']:>6} {row['run']:<12} {row['create_ms']:>10} {row['startup_ms']:>11} "
+                  f"{row['alive_ms']:>9} {row['ready_ms']:>9} {row['requests']:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='fake notion response delay in seconds')
+    parser.add_argument('--rate', type=float, default=3.0,
+                        help='notion client requests per second, 3 as in production')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""
+Offline benchmark of series sync and renderers
+
+Runs Updater and AsyncSeriesMongo against local FakeNotion server and
+in-memory mongo (mongomock-motor) or local mongo if CON_STRING is set.
+mongomock scans whole collection on every _id lookup, so use local mongo
+for 10k runs and for numbers comparable with production.
+
+    python benchmarks/bench_sync.py --sizes 100 1000 10000 --latency 0.01 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'serials_notifier'),
+                os.path.join(ROOT, 'subscriptions_notifier')]
+os.environ.setdefault('SUBS_ID', 'subs-db')
+
+from fake_notion import FakeNotion, make_series, make_subscriptions  # noqa: E402
+from manage_subscriptions import get_subs  # noqa: E402
+from mongo_series import AsyncSeriesMongo  # noqa: E402
+from notion_api import NotionClient  # noqa: E402
+from updater_worker import Updater  # noqa: E402
+
+
+SERIES_DB = 'series-db'
+GETTERS = ['get_today', 'get_tommorow', 'get_this_week', 'get_next_week',
+           'get_month', 'get_wanted', 'get_digest']
+
+
+def mongo_client():
+    if 'CON_STRING' in os.environ:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(os.environ['CON_STRING'])
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()
+
+
+async def measure(name: str, size: int, fake: FakeNotion, coro) -> dict:
+    """
+    Measures wall time, notion request count and peak python memory of one step
+
+    Returns:
+        dict: measurement row
+    """
+    requests_before = fake.total_requests
+    tracemalloc.start()
+    start = time.perf_counter()
+    await coro
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"size": size, "step": name, "wall_ms": round(wall * 1000, 2),
+            "requests": fake.total_requests - requests_before, "peak_kib": round(peak / 1024, 1)}
+
+
+async def run_size(size: int, args: argparse.Namespace) -> list:
+    fake = FakeNotion(latency=args.latency, error_rate=args.error_rate)
+    fake.add_database(SERIES_DB, make_series(size))
+    fake.add_database(os.environ['SUBS_ID'], make_subscriptions(max(size // 10, 1)))
+    url = await fake.start()
+
+    mongo = mongo_client()
+    await mongo.series['series'].delete_many({})
+    await mongo.series['sync_state'].delete_many({})
+    await mongo.series['calendar'].delete_many({})
+
+    notion = NotionClient('fake', base_url=url, rate=args.rate, backoff=0.05)
+    updater = Updater(notion, SERIES_DB, mongo)
+    series_db = AsyncSeriesMongo(mongo)
+
+    rows = [
+        await measure('update_dates (full)', size, fake, updater.update_dates(full=True)),
+        await measure('update_dates (delta)', size, fake, updater.update_dates()),
+        await measure('notion_to_mongo', size, fake, updater.notion_to_mongo()),
+        await measure('get_subs', size, fake, get_subs(notion)),
+    ]
+    for getter in GETTERS:
+        rows.append(await measure(getter, size, fake, getattr(series_db, getter)()))
+    rows.append({"size": size, "step": "429 injected", "wall_ms": 0,
+                 "requests": fake.requests['429'], "peak_kib": 0})
+
+    await notion.aclose()
+    await fake.stop()
+    return rows
+
+
+def print_table(rows: list) -> None:
+    print(f"{'size':>6} {'step':<22} {'wall ms':>10} {'requests':>9} {'peak KiB':>10}")
+    for row in rows:
+        print(f"{row['size']:>6} {row['step']:<22} {row['wall_ms']:>10} "
+              f"{row['requests']:>9} {row['peak_kib']:>10}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    rows = list()
+    for size in args.sizes:
+        rows += await run_size(size, args)
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='fake notion response delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of fake notion responses which are 429')
+    parser.add_argument('--rate', type=float, default=1000.0,
+                        help='notion client requests per second')
+    parser.add_argument('--json', help='also write results to json file')
+    asyncio.run(main(parser.parse_args()))
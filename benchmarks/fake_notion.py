@@ -0,0 +1,231 @@
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiohttp import web
+
+
+SERIES_STATUSES = ["Смотрю", "Хочу посмотреть", "Просмотренно"]
+SERIES_TYPES = ["Аниме", "Сериал", "Мультсериал"]
+
+
+def now_iso() -> str:
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def date_prop(date_: Optional[datetime]) -> dict:
+    if date_ is None:
+        return {"date": None}
+    return {"date": {"start": date_.strftime('%Y-%m-%d'), "end": None, "time_zone": None}}
+
+
+def make_series(n: int, seed: int = 0) -> list:
+    """
+    Creates synthetic series database pages
+
+    Args:
+        n (int): number of pages
+        seed (int): random seed
+
+    Returns:
+        list: notion pages
+    """
+    rnd = random.Random(seed)
+    today_ = datetime.combine(datetime.now().date(), datetime.min.time())
+    pages = list()
+    for i in range(n):
+        status = rnd.choices(SERIES_STATUSES, weights=[6, 2, 2])[0]
+        release = today_ - timedelta(days=rnd.randint(-60, 2000))
+        next_date = release + timedelta(days=7 * rnd.randint(0, 10))
+        pages.append({
+            "object": "page",
+            "id": f"serie-{i:06d}",
+            "last_edited_time": now_iso(),
+            "properties": {
+                "Название": {"title": [{"text": {"content": f"Сериал {i}"}}]},
+                "Статус": {"select": {"name": status}},
+                "Сезон": {"number": rnd.randint(1, 8)},
+                "Закончен сезон?": {"select": {"name": rnd.choices(["Нет", "Да"], weights=[4, 1])[0]}},
+                "Дата выхода": date_prop(release),
+                "Следующая серия выйдет": date_prop(next_date),
+                "Тип": {"select": {"name": rnd.choice(SERIES_TYPES)}},
+                "Периодичность": {"select": {"name": rnd.choices(
+                    ["Каждую неделю", "Каждый день", "Раз в две недели"], weights=[8, 1, 1])[0]}},
+            }
+        })
+    return pages
+
+
+def make_subscriptions(n: int, seed: int = 0) -> list:
+    """
+    Creates synthetic subscriptions database pages
+
+    Args:
+        n (int): number of pages
+        seed (int): random seed
+
+    Returns:
+        list: notion pages
+    """
+    rnd = random.Random(seed)
+    pages = list()
+    for i in range(n):
+        price = rnd.choice([99, 199, 299, 599, 1990])
+        yearly = rnd.random() < 0.3
+        pages.append({
+            "object": "page",
+            "id": f"sub-{i:06d}",
+            "last_edited_time": now_iso(),
+            "properties": {
+                "Подписка": {"title": [{"text": {"content": f"Подписка {i}"}}]},
+                "Тип": {"select": {"name": rnd.choice(["Личная подписка", "Семейная подписка"])}},
+                "Цена": {"number": price},
+                "Я плочу": {"formula": {"number": price}},
+                "Период": {"select": {"name": "Годовая" if yearly else "Ежемесячная"}},
+                "Я плочу в месяц": {"formula": {"number": round(price / 12 if yearly else price, 2)}},
+                "Дата списания": date_prop(datetime.now() + timedelta(days=rnd.randint(-10, 60))),
+            }
+        })
+    return pages
+
+
+class FakeNotion:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, retry_after: float = 0.05,
+                 seed: int = 0) -> None:
+        """
+        Local stand-in for notion api with paginated queries, pages and blocks endpoints
+
+        Args:
+            latency (float): delay of every response in seconds
+            error_rate (float): share of requests answered with 429
+            retry_after (float): Retry-After sent with 429
+            seed (int): random seed of 429 injection
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rnd = random.Random(seed)
+        self.databases = dict()
+        self.pages = dict()
+        self.requests = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def add_database(self, db_id: str, pages: list) -> None:
+        self.databases[db_id] = [page['id'] for page in pages]
+        for page in pages:
+            self.pages[page['id']] = page
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    async def _delay_or_throttle(self, route: str) -> Optional[web.Response]:
+        self.requests[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.rnd.random() < self.error_rate:
+            self.requests['429'] += 1
+            return web.json_response({"object": "error", "status": 429, "code": "rate_limited"},
+                                     status=429, headers={'Retry-After': str(self.retry_after)})
+        return None
+
+    async def query(self, request: web.Request) -> web.Response:
+        throttled = await self._delay_or_throttle('query')
+        if throttled is not None:
+            return throttled
+        body = await request.json()
+        ids = self.databases.get(request.match_info['db_id'])
+        if ids is None:
+            return web.json_response({"object": "error", "status": 404}, status=404)
+
+        rows = [self.pages[i] for i in ids if i in self.pages]
+        since = body.get('filter', {}).get('last_edited_time', {}).get('on_or_after')
+        if since is not None:
+            rows = [row for row in rows if row['last_edited_time'] >= since]
+
+        start = int(body.get('start_cursor') or 0)
+        end = min(start + min(body.get('page_size', 100), 100), len(rows))
+        has_more = end < len(rows)
+        return web.json_response({
+            "object": "list",
+            "results": rows[start:end],
+            "has_more": has_more,
+            "next_cursor": str(end) if has_more else None,
+        })
+
+    async def create_page(self, request: web.Request) -> web.Response:
+        throttled = await self._delay_or_throttle('create')
+        if throttled is not None:
+            return throttled
+        body = await request.json()
+        page = {"object": "page", "id": f"page-{len(self.pages):06d}",
+                "last_edited_time": now_iso(), "properties": body.get('properties', {})}
+        self.pages[page['id']] = page
+        self.databases.setdefault(body['parent']['database_id'], []).append(page['id'])
+        return web.json_response(page)
+
+    async def retrieve_page(self, request: web.Request) -> web.Response:
+        throttled = await self._delay_or_throttle('retrieve')
+        if throttled is not None:
+            return throttled
+        page_id = request.match_info['page_id']
+        page = self.pages.get(page_id)
+        if page is None:
+            return web.json_response({"object": "error", "status": 404}, status=404)
+        db_id = next((db_id for db_id, ids in self.databases.items() if page_id in ids), None)
+        return web.json_response({**page, "parent": {"type": "database_id", "database_id": db_id}})
+
+    async def update_page(self, request: web.Request) -> web.Response:
+        throttled = await self._delay_or_throttle('update')
+        if throttled is not None:
+            return throttled
+        page = self.pages.get(request.match_info['page_id'])
+        if page is None:
+            return web.json_response({"object": "error", "status": 404}, status=404)
+        body = await request.json()
+        page['properties'].update(body.get('properties', {}))
+        page['last_edited_time'] = now_iso()
+        return web.json_response(page)
+
+    async def delete_block(self, request: web.Request) -> web.Response:
+        throttled = await self._delay_or_throttle('delete')
+        if throttled is not None:
+            return throttled
+        page = self.pages.pop(request.match_info['block_id'], None)
+        if page is None:
+            return web.json_response({"object": "error", "status": 404}, status=404)
+        return web.json_response({**page, "archived": True})
+
+    async def me(self, request: web.Request) -> web.Response:
+        self.requests['me'] += 1
+        return web.json_response({"object": "user", "id": "fake-bot", "type": "bot"})
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Starts http server
+
+        Returns:
+            str: base url to pass to NotionClient
+        """
+        app = web.Application()
+        app.router.add_post('/v1/databases/{db_id}/query', self.query)
+        app.router.add_post('/v1/pages', self.create_page)
+        app.router.add_get('/v1/pages/{page_id}', self.retrieve_page)
+        app.router.add_patch('/v1/pages/{page_id}', self.update_page)
+        app.router.add_delete('/v1/blocks/{block_id}', self.delete_block)
+        app.router.add_get('/v1/users/me', self.me)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}/v1'
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,51 @@
+"""
+Replays recorded telegram updates to local webhook endpoint
+
+Posts every update json to running bot (WEBHOOK_URL set) and reports ack
+latency, handlers then run in bot as for real telegram requests.
+
+    python benchmarks/post_updates.py benchmarks/updates/*.json --url http://localhost:8080/webhook --secret $WEBHOOK_SECRET
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def post_updates(url: str, updates: list, secret: str = None, repeat: int = 1) -> list:
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    latencies = list()
+    async with httpx.AsyncClient() as client:
+        for i in range(repeat):
+            for update in updates:
+                # telegram never sends same update twice, keep ids unique
+                update = dict(update, update_id=update['update_id'] + i)
+                start = time.perf_counter()
+                response = await client.post(url, json=update, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='recorded update json files')
+    parser.add_argument('--url', default='http://localhost:8080/webhook')
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    updates = list()
+    for path in args.files:
+        with open(path) as f:
+            updates.append(json.load(f))
+    latencies = asyncio.run(post_updates(args.url, updates, args.secret, args.repeat))
+    print(f"{len(latencies)} updates acked, median {statistics.median(latencies) * 1000:.2f} ms, "
+          f"max {max(latencies) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
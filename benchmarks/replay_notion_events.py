@@ -0,0 +1,115 @@
+"""
+Offline replay of recorded notion webhook events
+
+Starts FakeNotion with series database, runs full sync into in-memory mongo
+(or local mongo if CON_STRING is set), then posts signed events to local
+NotionEventReceiver and reports time until pages are synced and notion
+requests spent, compared with full sync.
+
+    python benchmarks/replay_notion_events.py benchmarks/notion_events/*.json --size 1000
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+import httpx
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'common'), os.path.join(ROOT, 'serials_notifier')]
+
+from bench_sync import SERIES_DB, mongo_client  # noqa: E402
+from fake_notion import FakeNotion, make_series, now_iso  # noqa: E402
+from notion_api import NotionClient  # noqa: E402
+from notion_events import SIGNATURE_HEADER, NotionEventReceiver, make_events_app  # noqa: E402
+from tenants import Tenants  # noqa: E402
+
+TOKEN = 'replay-token'
+
+
+def sign(body: bytes) -> str:
+    return 'sha256=' + hmac.new(TOKEN.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def replay(events: list, size: int, debounce: float) -> None:
+    fake = FakeNotion()
+    fake.add_database(SERIES_DB, make_series(size))
+    url = await fake.start()
+    mongo = mongo_client()
+    await mongo.series['series'].delete_many({})
+    notion = NotionClient('fake', base_url=url, rate=1000, backoff=0.05)
+    tenants = Tenants(notion, mongo, SERIES_DB)
+
+    start = time.perf_counter()
+    before = fake.total_requests
+    await tenants.default.updater.update_dates(full=True)
+    full_ms = (time.perf_counter() - start) * 1000
+    full_requests = fake.total_requests - before
+
+    # recorded edits are applied to fake notion before events arrive
+    for event in events:
+        page = fake.pages.get(event['entity']['id'])
+        if page is not None and event['type'] == 'page.deleted':
+            fake.pages.pop(page['id'])
+        elif page is not None:
+            page['properties']['Статус'] = {"select": {"name": "Смотрю"}}
+            page['last_edited_time'] = now_iso()
+
+    async def db_ids():
+        return [SERIES_DB]
+
+    receiver = NotionEventReceiver(notion, tenants, db_ids, TOKEN, debounce=debounce)
+    runner = web.AppRunner(make_events_app(receiver))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    endpoint = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/notion"
+
+    before = fake.total_requests
+    start = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        for event in events:
+            body = json.dumps(event).encode()
+            res = await client.post(endpoint, content=body, headers={SIGNATURE_HEADER: sign(body)})
+            res.raise_for_status()
+    await receiver._flush_task
+    events_ms = (time.perf_counter() - start) * 1000
+    events_requests = fake.total_requests - before
+
+    series = mongo.series['series']
+    for event in events:
+        doc = await series.find_one({'_id': event['entity']['id']})
+        state = 'deleted' if doc is None else doc['status']
+        print(f"{event['type']:<26} {event['entity']['id']:<16} -> {state}")
+    print(f"full sync: {full_ms:.0f} ms, {full_requests} notion requests")
+    print(f"{len(events)} events: {events_ms:.0f} ms including {debounce} s debounce, "
+          f"{events_requests} notion requests")
+
+    await runner.cleanup()
+    await notion.aclose()
+    await fake.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='*', help='recorded event json files')
+    parser.add_argument('--size', type=int, default=1000, help='pages in fake series database')
+    parser.add_argument('--debounce', type=float, default=0.2)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(ROOT, 'benchmarks', 'notion_events', '*.json')))
+    events = list()
+    for path in files:
+        with open(path) as f:
+            events.append(json.load(f))
+    asyncio.run(replay(events, args.size, args.debounce))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from rate_limit import TokenBucket
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """
+    Extracts flood wait from telegram client error
+
+    Args:
+        e (Exception): aiogram RetryAfter or telebot ApiTelegramException
+
+    Returns:
+        Optional[float]: seconds to wait, None if error is not flood control
+    """
+    timeout = getattr(e, 'timeout', None)
+    if isinstance(timeout, (int, float)):
+        return timeout
+    result = getattr(e, 'result_json', None) or dict()
+    return result.get('parameters', {}).get('retry_after')
+
+
+class BroadcastStats:
+    def __init__(self) -> None:
+        """
+        Counters of one broadcast
+        """
+        self.rendered = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def __str__(self) -> str:
+        return (f"{self.rendered} distinct messages, {self.sent} sent, "
+                f"{self.failed} failed, {self.retried} retried")
+
+
+class Broadcaster:
+    def __init__(self, send: Callable[[int, str], Awaitable], rate: float = 30, per_chat_interval: float = 1.0,
+                 concurrency: int = 30, max_retries: int = 3) -> None:
+        """
+        Fans messages out to many chats within telegram global and per-chat limits
+
+        Args:
+            send (Callable[[int, str], Awaitable]): sends text to chat
+            rate (float): global messages per second
+            per_chat_interval (float): min seconds between messages to one chat
+            concurrency (int): max sends in flight
+            max_retries (int): retries on flood control errors
+        """
+        self.send = send
+        self.rate_limiter = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self._last_sent = dict()
+
+    def _evict_idle(self) -> None:
+        """
+        Forgets chats messaged longer than per-chat interval ago, they can be sent to at once
+        """
+        now = time.monotonic()
+        self._last_sent = {chat_id: last for chat_id, last in self._last_sent.items()
+                           if now - last < self.per_chat_interval}
+
+    async def _wait_chat(self, chat_id: int) -> None:
+        last = self._last_sent.get(chat_id)
+        if last is not None:
+            delay = last + self.per_chat_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self._last_sent[chat_id] = time.monotonic()
+
+    async def _send_one(self, chat_id: int, text: str, stats: BroadcastStats) -> None:
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_chat(chat_id)
+                await self.rate_limiter.acquire()
+                try:
+                    await self.send(chat_id, text)
+                    stats.sent += 1
+                    return
+                except Exception as e:
+                    delay = retry_after(e)
+                    if delay is None or attempt == self.max_retries:
+                        logging.warning(f"Failed to send message to {chat_id}: {e!r}")
+                        stats.failed += 1
+                        return
+                    stats.retried += 1
+                    await asyncio.sleep(delay)
+
+    async def broadcast(self, messages: Dict[str, Iterable[int]]) -> BroadcastStats:
+        """
+        Sends every text to its chats, each text is rendered once for all its chats
+
+        Args:
+            messages (Dict[str, Iterable[int]]): text to chat ids
+
+        Returns:
+            BroadcastStats: broadcast counters
+        """
+        self._evict_idle()
+        stats = BroadcastStats()
+        stats.rendered = len(messages)
+        await asyncio.gather(*[self._send_one(chat_id, text, stats)
+                               for text, chats in messages.items() for chat_id in chats])
+        logging.info(f"Broadcast finished: {stats}")
+        return stats
+
+
+def group_by_text(rendered: Dict[str, str], chats: Dict[str, Iterable[int]]) -> Dict[str, list]:
+    """
+    Merges chats of databases which rendered identical text
+
+    Args:
+        rendered (Dict[str, str]): database id to rendered text
+        chats (Dict[str, Iterable[int]]): database id to chat ids
+
+    Returns:
+        Dict[str, list]: text to chat ids
+    """
+    messages = dict()
+    for db_id, text in rendered.items():
+        messages.setdefault(text, []).extend(chats.get(db_id, []))
+    return messages
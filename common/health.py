@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+from metrics import DEPENDENCY_UP
+
+
+class Health:
+    def __init__(self, ttl: float = 5.0, timeout: float = 2.0) -> None:
+        """
+        Dependency checks behind liveness and readiness probes, results are cached
+        for ttl so frequent probes do not load mongo, notion and telegram
+
+        Args:
+            ttl (float): seconds check results are reused
+            timeout (float): seconds one check may take before it fails
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.started = time.monotonic()
+        # name to check and whether readiness depends on it
+        self._checks: Dict[str, tuple] = dict()
+        self._results: Dict[str, dict] = dict()
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.warm_up_done = False
+
+    def add(self, name: str, check: Callable[[], Awaitable], required: bool = True) -> None:
+        """
+        Registers dependency check
+
+        Args:
+            name (str): dependency name, e.g. mongo
+            check (Callable[[], Awaitable]): coroutine function, raises if dependency is down
+            required (bool): instance is not ready while dependency is down
+        """
+        self._checks[name] = (check, required)
+
+    async def _run(self, name: str) -> dict:
+        check, required = self._checks[name]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+            result = {'ok': True}
+        except Exception as e:
+            result = {'ok': False, 'error': repr(e)}
+        result.update(required=required, latency_ms=round((time.perf_counter() - start) * 1000, 1))
+        DEPENDENCY_UP.labels(name).set(result['ok'])
+        return result
+
+    async def check(self) -> Dict[str, dict]:
+        """
+        Runs all checks concurrently unless results are fresh
+
+        Returns:
+            Dict[str, dict]: dependency name to result with ok, required, latency_ms and error
+        """
+        async with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at >= self.ttl:
+                results = await asyncio.gather(*[self._run(name) for name in self._checks])
+                self._results = dict(zip(self._checks, results))
+                self._checked_at = time.monotonic()
+        return self._results
+
+    async def ready(self) -> bool:
+        """
+        Instance is ready when warm up finished and required dependencies are up
+        """
+        if not self.warm_up_done:
+            return False
+        return all(result['ok'] for result in (await self.check()).values() if result['required'])
+
+    async def liveness(self, request: web.Request) -> web.Response:
+        """
+        Event loop is responsive, dependencies are not checked so outages do not restart container
+        """
+        return web.json_response({'alive': True, 'uptime': round(time.monotonic() - self.started, 1)})
+
+    async def readiness(self, request: web.Request) -> web.Response:
+        checks = await self.check()
+        ready = await self.ready()
+        return web.json_response({'ready': ready, 'warm_up_done': self.warm_up_done, 'checks': checks},
+                                 status=200 if ready else 503)
+
+
+def make_health_app(health: Health) -> web.Application:
+    """
+    Builds aiohttp application with /healthz liveness and /readyz readiness endpoints
+
+    Args:
+        health (Health): dependency checks
+
+    Returns:
+        web.Application: application
+    """
+    app = web.Application()
+    app.router.add_get('/healthz', health.liveness)
+    app.router.add_get('/readyz', health.readiness)
+    return app
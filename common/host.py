@@ -0,0 +1,347 @@
+import asyncio
+import importlib
+import logging
+import os
+import time
+
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Type
+
+from aiogram import Bot, Dispatcher, executor, types
+from aiogram.bot.api import TelegramAPIServer
+from aiohttp import web
+from broadcast import Broadcaster
+from health import Health, make_health_app
+from metrics import STARTUP_SECONDS, TELEGRAM_SEND_SECONDS, start_metrics_server, timed
+from motor.motor_asyncio import AsyncIOMotorClient
+from notion_api import NotionClient
+from scheduler import Scheduler
+from webhook import make_webhook_app
+
+
+# plugin name to module and class, modules are imported only when plugin is loaded
+PLUGIN_CLASSES: Dict[str, str] = {
+    'series': 'series_plugin.SeriesPlugin',
+    'subs': 'subs_plugin.SubsPlugin',
+}
+
+
+@dataclass
+class HostConfig:
+    api_key: str
+    bot_token: str
+    # mongo is optional for plugins which keep no state there, e.g. single user subscriptions
+    con_string: Optional[str] = None
+    metrics_port: Optional[int] = 8000
+    # liveness and readiness probes, disabled if None
+    health_port: Optional[int] = 8081
+    # webhook mode when public url is set, long polling otherwise
+    webhook_url: Optional[str] = None
+    webhook_path: str = '/webhook'
+    # required in webhook mode, telegram sends it with every update
+    webhook_secret: Optional[str] = None
+    webhook_host: str = '0.0.0.0'
+    webhook_port: int = 8080
+    # local bot api server, api.telegram.org if None
+    telegram_api: Optional[str] = None
+    # scheduled jobs must run on one replica only
+    run_jobs: bool = True
+    state_dir: str = '.'
+    # plugins loaded by host.py, both notifiers by default
+    plugins: str = 'series,subs'
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> 'HostConfig':
+        """
+        Reads host configuration, called by factory so modules import without environment
+
+        Args:
+            env (Mapping[str, str]): environment
+
+        Returns:
+            HostConfig: configuration
+        """
+        def port(name: str, default: str) -> Optional[int]:
+            value = env.get(name, default)
+            return int(value) if value else None
+
+        return cls(
+            api_key=env['API_SECRET'],
+            bot_token=env['BOT_TOKEN'],
+            con_string=env.get('CON_STRING'),
+            metrics_port=port('METRICS_PORT', '8000'),
+            health_port=port('HEALTH_PORT', '8081'),
+            webhook_url=env.get('WEBHOOK_URL'),
+            webhook_path=env.get('WEBHOOK_PATH', '/webhook'),
+            webhook_secret=env.get('WEBHOOK_SECRET'),
+            webhook_host=env.get('WEBHOOK_HOST', '0.0.0.0'),
+            webhook_port=int(env.get('WEBHOOK_PORT', 8080)),
+            telegram_api=env.get('TELEGRAM_API_URL'),
+            run_jobs=env.get('RUN_JOBS', '1') == '1',
+            state_dir=env.get('STATE_DIR', '.'),
+            plugins=env.get('PLUGINS', 'series,subs'),
+        )
+
+    def __post_init__(self) -> None:
+        if self.webhook_url and not self.webhook_secret:
+            raise ValueError("WEBHOOK_SECRET is required when WEBHOOK_URL is set")
+
+
+class MeteredBot(Bot):
+    @timed(TELEGRAM_SEND_SECONDS)
+    async def send_message(self, *args, **kwargs) -> types.Message:
+        return await super().send_message(*args, **kwargs)
+
+
+class Plugin:
+    """
+    Notifier loaded into host, registers its handlers and jobs on shared
+    dispatcher and scheduler
+    """
+    name = 'plugin'
+
+    def __init__(self, host: 'Host', env: Mapping[str, str] = os.environ) -> None:
+        self.host = host
+
+    @property
+    def handles_updates(self) -> bool:
+        """
+        Whether plugin registered telegram handlers, updates are received only if any plugin did
+        """
+        return False
+
+    @property
+    def uses_mongo(self) -> bool:
+        """
+        Whether plugin keeps data in mongo, mongo health gates readiness only then
+        """
+        return False
+
+    def setup(self) -> None:
+        pass
+
+    async def startup(self) -> None:
+        """
+        Quick startup steps which must finish before updates are received
+        """
+        pass
+
+    async def warm_up(self) -> None:
+        """
+        Slow startup steps, e.g. first sync, run concurrently with startup of other plugins
+        and update receiving, instance becomes ready when they finish
+        """
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class Host:
+    def __init__(self, config: HostConfig, mongo_client: Optional[AsyncIOMotorClient] = None) -> None:
+        """
+        Single process runtime of notifiers, plugins share event loop, telegram session
+        with its send rate limit, notion client, mongo client and scheduler.
+        No connection is opened until startup
+
+        Args:
+            config (HostConfig): configuration
+            mongo_client (AsyncIOMotorClient): client to use instead of one from con_string
+        """
+        self.config = config
+        self.state_dir = config.state_dir
+        self.run_jobs = config.run_jobs
+        server = TelegramAPIServer.from_base(config.telegram_api) if config.telegram_api else None
+        self.bot = MeteredBot(token=config.bot_token, **({'server': server} if server else {}))
+        self.dp = Dispatcher(self.bot)
+        self.notion = NotionClient(config.api_key)
+        self._mongo_client = mongo_client
+        self.broadcaster = Broadcaster(lambda chat_id, text: self.bot.send_message(chat_id, text=text))
+        self.scheduler: Optional[Scheduler] = None
+        self.plugins: List[Plugin] = list()
+        self.health = Health()
+        self.created = time.monotonic()
+        self._warm_up: Optional[asyncio.Task] = None
+        self._health_runner: Optional[web.AppRunner] = None
+
+    @property
+    def mongo_client(self) -> Optional[AsyncIOMotorClient]:
+        """
+        Lazily created motor client, None if mongo is not configured
+        """
+        if self._mongo_client is None and self.config.con_string:
+            self._mongo_client = AsyncIOMotorClient(self.config.con_string)
+        return self._mongo_client
+
+    @property
+    def has_mongo(self) -> bool:
+        return self._mongo_client is not None or bool(self.config.con_string)
+
+    def load(self, plugin_classes: List[Type[Plugin]], env: Mapping[str, str] = os.environ) -> None:
+        """
+        Creates plugins and registers their handlers, jobs and health checks
+
+        Args:
+            plugin_classes (List[Type[Plugin]]): plugin classes
+            env (Mapping[str, str]): environment plugins read their configuration from
+        """
+        self.plugins = [cls(self, env) for cls in plugin_classes]
+        # separately deployed plugins keep their own state file, e.g. series_scheduler.json
+        names = '_'.join(plugin.name for plugin in self.plugins)
+        self.scheduler = Scheduler(os.path.join(self.state_dir, f'{names}_scheduler.json'))
+        for plugin in self.plugins:
+            plugin.setup()
+            logging.info(f"Loaded plugin {plugin.name}")
+
+        self.health.add('telegram', self.bot.get_me)
+        # views are served from local data during notion outage, so notion does not gate readiness
+        self.health.add('notion', self.check_notion, required=False)
+        if self.has_mongo:
+            self.health.add('mongo', self.check_mongo,
+                            required=any(plugin.uses_mongo for plugin in self.plugins))
+
+    @property
+    def handles_updates(self) -> bool:
+        return any(plugin.handles_updates for plugin in self.plugins)
+
+    async def check_notion(self) -> None:
+        res = await self.notion.ping()
+        if res.status_code != 200:
+            raise RuntimeError(f"Notion responded {res.status_code}")
+
+    async def check_mongo(self) -> None:
+        await self.mongo_client.admin.command('ping')
+
+    async def warm_up(self) -> None:
+        """
+        Runs slow startup steps of all plugins concurrently, failed steps are logged
+        and instance still becomes ready with data from last run
+        """
+        results = await asyncio.gather(*[plugin.warm_up() for plugin in self.plugins], return_exceptions=True)
+        for plugin, result in zip(self.plugins, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Warm up of plugin {plugin.name} failed: {result!r}")
+        self.health.warm_up_done = True
+        STARTUP_SECONDS.set(time.monotonic() - self.created)
+        logging.info(f"Host warmed up in {time.monotonic() - self.created:.2f}s")
+
+    async def start_health_server(self) -> web.AppRunner:
+        runner = web.AppRunner(make_health_app(self.health), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, port=self.config.health_port).start()
+        logging.info(f"Serving health probes on port {self.config.health_port}")
+        return runner
+
+    async def on_startup(self, _=None) -> None:
+        """
+        Serve probes and metrics, start plugins, then warm up and run scheduler in background
+        """
+        if self.config.health_port:
+            self._health_runner = await self.start_health_server()
+        if self.config.metrics_port:
+            start_metrics_server(self.config.metrics_port)
+        for plugin in self.plugins:
+            await plugin.startup()
+        self._warm_up = asyncio.create_task(self.warm_up())
+        if self.run_jobs:
+            asyncio.create_task(self.scheduler.run())
+
+    async def on_webhook_startup(self, app: web.Application) -> None:
+        """
+        Register webhook in telegram on replica running jobs only, other replicas
+        serve the same url, updates queued while replicas restart are kept
+        """
+        await self.on_startup(app)
+        if not self.run_jobs:
+            return
+        webhook_url = self.config.webhook_url.rstrip('/') + self.config.webhook_path
+        await self.bot.set_webhook(webhook_url, secret_token=self.config.webhook_secret,
+                                   drop_pending_updates=False)
+        logging.info(f"Bot webhook set to {self.config.webhook_url}")
+
+    async def on_shutdown(self, _=None) -> None:
+        """
+        Stop plugins and close Notion and mongo connection pools
+        """
+        if self._warm_up is not None and not self._warm_up.done():
+            self._warm_up.cancel()
+        for plugin in reversed(self.plugins):
+            await plugin.shutdown()
+        if self._health_runner is not None:
+            await self._health_runner.cleanup()
+        await self.notion.aclose()
+        if self._mongo_client is not None:
+            self._mongo_client.close()
+
+    async def on_webhook_shutdown(self, app: web.Application) -> None:
+        """
+        Close connections and telegram session, executor does it in polling mode
+        """
+        await self.on_shutdown(app)
+        session = await self.bot.get_session()
+        await session.close()
+
+    def run(self) -> None:
+        """
+        Runs host until stopped, telegram updates are received with webhook or long
+        polling, host without handlers only runs scheduled jobs
+        """
+        config = self.config
+        if not self.handles_updates:
+            logging.info("Host starting without telegram updates")
+            executor.start(self.dp, asyncio.Event().wait(),
+                           on_startup=self.on_startup, on_shutdown=self.on_shutdown)
+        elif config.webhook_url:
+            logging.info(f"Bot starting webhook server on "
+                         f"{config.webhook_host}:{config.webhook_port}{config.webhook_path}")
+            web.run_app(make_webhook_app(self.dp, config.webhook_path, config.webhook_secret,
+                                         on_startup=[self.on_webhook_startup],
+                                         on_shutdown=[self.on_webhook_shutdown]),
+                        host=config.webhook_host, port=config.webhook_port)
+        else:
+            logging.info("Bot starting polling")
+            executor.start_polling(self.dp, skip_updates=True,
+                                   on_startup=self.on_startup, on_shutdown=self.on_shutdown)
+
+
+def plugin_class(name: str) -> Type[Plugin]:
+    module, cls = PLUGIN_CLASSES[name].rsplit('.', 1)
+    return getattr(importlib.import_module(module), cls)
+
+
+def create_host(plugin_classes: Optional[List[Type[Plugin]]] = None, env: Mapping[str, str] = os.environ,
+                mongo_client: Optional[AsyncIOMotorClient] = None) -> Host:
+    """
+    Application factory, builds host and plugins from environment without
+    opening connections, so it can be used in tests and benchmarks
+
+    Args:
+        plugin_classes (List[Type[Plugin]]): plugin classes, PLUGINS from environment if None
+        env (Mapping[str, str]): environment
+        mongo_client (AsyncIOMotorClient): client to use instead of one from CON_STRING
+
+    Returns:
+        Host: host with loaded plugins
+    """
+    config = HostConfig.from_env(env)
+    if plugin_classes is None:
+        plugin_classes = [plugin_class(name.strip()) for name in config.plugins.split(',') if name.strip()]
+    host = Host(config, mongo_client)
+    host.load(plugin_classes, env)
+    return host
+
+
+def run(plugin_classes: Optional[List[Type[Plugin]]] = None) -> None:
+    """
+    Runs host with plugins configured from environment
+
+    Args:
+        plugin_classes (List[Type[Plugin]]): plugin classes, PLUGINS from environment if None
+    """
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    create_host(plugin_classes).run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,95 @@
+import functools
+import logging
+import re
+import time
+from typing import Awaitable, Callable
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+
+NOTION_REQUEST_SECONDS = Histogram(
+    'notion_request_seconds', 'Notion api request latency', ['method', 'endpoint'])
+NOTION_RETRIES = Counter(
+    'notion_retries_total', 'Notion api requests retried', ['reason'])
+NOTION_RESPONSES = Counter(
+    'notion_responses_total', 'Notion api responses', ['method', 'endpoint', 'status'])
+NOTION_ROWS_REJECTED = Counter(
+    'notion_rows_rejected_total', 'Notion rows skipped without required property', ['schema', 'field'])
+
+MONGO_QUERY_SECONDS = Histogram(
+    'mongo_query_seconds', 'Mongo query latency', ['query'])
+
+TELEGRAM_SEND_SECONDS = Histogram(
+    'telegram_send_seconds', 'Telegram send_message latency')
+COMMAND_SECONDS = Histogram(
+    'command_seconds', 'Bot command handler latency', ['command'])
+
+SYNC_SECONDS = Histogram(
+    'sync_seconds', 'Series sync duration', buckets=(1, 5, 10, 30, 60, 120, 300, 600, float('inf')))
+SYNC_ROWS_CHANGED = Counter(
+    'sync_rows_changed_total', 'Mongo documents changed by sync')
+SYNC_LAST_ROWS_CHANGED = Gauge(
+    'sync_last_rows_changed', 'Mongo documents changed by last sync')
+SYNC_LAST_SECONDS = Gauge(
+    'sync_last_seconds', 'Duration of last sync')
+SYNC_FAILURES = Counter(
+    'sync_failures_total', 'Failed or timed out syncs')
+
+SCHEDULER_LAG_SECONDS = Histogram(
+    'scheduler_lag_seconds', 'Delay between job deadline and job start', ['job'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 60, 600, 3600, float('inf')))
+SCHEDULER_FAILURES = Counter(
+    'scheduler_failures_total', 'Failed scheduled job runs', ['job'])
+
+DEPENDENCY_UP = Gauge(
+    'dependency_up', 'Last health check of dependency succeeded', ['dependency'])
+STARTUP_SECONDS = Gauge(
+    'startup_seconds', 'Seconds from host creation to ready')
+
+NOTION_ID = re.compile(r'/(?=[0-9a-zA-Z-]*\d)[0-9a-zA-Z-]{8,}(?=/|$)')
+
+
+def notion_endpoint(path: str) -> str:
+    """
+    Replaces ids in notion api path so it can be used as label
+
+    Args:
+        path (str): api path, e.g. /pages/1234-abcd
+
+    Returns:
+        str: endpoint, e.g. /pages/{id}
+    """
+    return NOTION_ID.sub('/{id}', path)
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    """
+    Decorator which observes coroutine run time
+
+    Args:
+        histogram (Histogram): histogram to observe
+        labels (str): histogram label values
+    """
+    metric = histogram.labels(*labels) if labels else histogram
+
+    def decorator(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def start_metrics_server(port: int) -> None:
+    """
+    Serves prometheus text metrics on /metrics in background thread
+
+    Args:
+        port (int): http port
+    """
+    start_http_server(port)
+    logging.info(f"Serving metrics on port {port}")
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from metrics import NOTION_REQUEST_SECONDS, NOTION_RESPONSES, NOTION_RETRIES, notion_endpoint
+from rate_limit import TokenBucket
+
+
+NOTION_URL = 'https://api.notion.com/v1'
+NOTION_VERSION = '2022-06-28'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# non-idempotent request may have been applied by notion unless it was not sent or was rate limited
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+UNAPPLIED_STATUSES = {429}
+
+
+class RequestStats:
+    def __init__(self) -> None:
+        """
+        Counters of notion requests outcome
+        """
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+    def __str__(self) -> str:
+        return f"{self.succeeded} succeeded, {self.failed} failed, {self.retried} retried"
+
+
+def _http2_available() -> bool:
+    """
+    Checks if h2 package is installed so httpx can speak HTTP/2
+
+    Returns:
+        bool: True if HTTP/2 can be enabled
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class NotionClient:
+    def __init__(self, api_key: str, base_url: str = NOTION_URL,
+                 timeout: Optional[float] = None, connect_timeout: Optional[float] = None,
+                 max_connections: int = 10, http2: Optional[bool] = None,
+                 rate: Optional[float] = None, max_retries: Optional[int] = None,
+                 backoff: float = 0.5) -> None:
+        """
+        Shared async Notion api client with one keep-alive connection pool
+
+        Args:
+            api_key (str): Notion api key string
+            base_url (str): Notion api url, can be overridden with NOTION_URL env
+            timeout (float): read/write/pool timeout in seconds, NOTION_TIMEOUT env by default
+            connect_timeout (float): connect timeout in seconds, NOTION_CONNECT_TIMEOUT env by default
+            max_connections (int): max connections kept in pool
+            http2 (bool): use HTTP/2, enabled by default if h2 is installed
+            rate (float): average requests per second, NOTION_RATE env or 3 by default
+            max_retries (int): retries on 429/5xx, NOTION_MAX_RETRIES env or 5 by default
+            backoff (float): base of exponential backoff in seconds
+        """
+        self.api_key = api_key
+        self.base_url = os.environ.get('NOTION_URL', base_url)
+        if timeout is None:
+            timeout = float(os.environ.get('NOTION_TIMEOUT', 30))
+        if connect_timeout is None:
+            connect_timeout = float(os.environ.get('NOTION_CONNECT_TIMEOUT', 10))
+        if http2 is None:
+            http2 = _http2_available()
+
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+
+        if rate is None:
+            rate = float(os.environ.get('NOTION_RATE', 3))
+        if max_retries is None:
+            max_retries = int(os.environ.get('NOTION_MAX_RETRIES', 5))
+        self.rate_limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            'Content-Type': 'application/json',
+            'Notion-Version': NOTION_VERSION
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Lazily creates pooled httpx client, so NotionClient can be built outside of event loop
+
+        Returns:
+            httpx.AsyncClient: pooled client
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers,
+                                             timeout=self.timeout, limits=self.limits,
+                                             http2=self.http2)
+        return self._client
+
+    def retry_delay(self, attempt: int, res: Optional[httpx.Response] = None) -> float:
+        """
+        Computes delay before retry, honours Retry-After header
+
+        Args:
+            attempt (int): number of retry starting from 0
+            res (httpx.Response): failed response if any
+
+        Returns:
+            float: delay in seconds with jitter
+        """
+        delay = self.backoff * 2 ** attempt
+        if res is not None and 'Retry-After' in res.headers:
+            try:
+                delay = float(res.headers['Retry-After'])
+            except ValueError:
+                pass
+        return delay + random.uniform(0, self.backoff)
+
+    async def request(self, method: str, path: str, json: Optional[dict] = None,
+                      stats: Optional[RequestStats] = None, idempotent: bool = True) -> httpx.Response:
+        """
+        Sends rate limited request to notion api through pooled connection,
+        retries on 429/5xx and transport errors. Non-idempotent request is retried
+        only if it was not sent or was rate limited, so e.g. page is never created twice
+
+        Args:
+            method (str): http method
+            path (str): api path, e.g. /pages
+            json (dict): request body
+            stats (RequestStats): counters to record retries into
+            idempotent (bool): request can be repeated after read timeout or 5xx
+
+        Returns:
+            httpx.Response: api response
+        """
+        endpoint = notion_endpoint(path)
+        latency = NOTION_REQUEST_SECONDS.labels(method, endpoint)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                res = await self.client.request(method, path, json=json)
+            except httpx.TransportError as e:
+                latency.observe(time.perf_counter() - start)
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                delay = self.retry_delay(attempt)
+                reason = type(e).__name__
+                logging.warning(
+                    f"Notion {method} {path} failed with {e!r}, retry in {delay:.1f}s")
+            else:
+                latency.observe(time.perf_counter() - start)
+                NOTION_RESPONSES.labels(method, endpoint, res.status_code).inc()
+                retry = RETRY_STATUSES if idempotent else UNAPPLIED_STATUSES
+                if res.status_code not in retry or attempt >= self.max_retries:
+                    break
+                delay = self.retry_delay(attempt, res)
+                reason = str(res.status_code)
+                logging.warning(
+                    f"Notion {method} {path} got response {res.status_code}, retry in {delay:.1f}s")
+            NOTION_RETRIES.labels(reason).inc()
+            if stats is not None:
+                stats.retried += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        if res.status_code != 200:
+            logging.warning(
+                f"Notion {method} {path} got response {res.status_code}")
+        return res
+
+    async def query_database(self, db_id: str, body: Optional[dict] = None) -> dict:
+        """
+        Queries notion database
+
+        Args:
+            db_id (str): Notion database id string
+            body (dict): query body (filter, sorts, start_cursor)
+
+        Returns:
+            dict: query result
+        """
+        res = await self.request('POST', f'/databases/{db_id}/query', json=body or {})
+        return res.json()
+
+    async def iter_query(self, db_id: str, body: Optional[dict] = None,
+                         page_size: int = 100) -> AsyncIterator[dict]:
+        """
+        Streams notion database query page by page following next_cursor.
+        Next page is requested before current one is yielded, so it is
+        downloaded while caller parses current page
+
+        Args:
+            db_id (str): Notion database id string
+            body (dict): query body (filter, sorts)
+            page_size (int): rows per page, notion allows max 100
+
+        Yields:
+            dict: query result page with "results" list
+        """
+        body = dict(body or {})
+        body['page_size'] = page_size
+        pending = asyncio.ensure_future(self.query_database(db_id, body))
+        try:
+            while pending is not None:
+                page = await pending
+                pending = None
+                if page.get('has_more') and page.get('next_cursor'):
+                    pending = asyncio.ensure_future(self.query_database(
+                        db_id, {**body, 'start_cursor': page['next_cursor']}))
+                yield page
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def ping(self) -> httpx.Response:
+        """
+        Checks notion reachability and api key with one request, which is not retried
+        """
+        await self.rate_limiter.acquire()
+        return await self.client.get('/users/me')
+
+    async def retrieve_page(self, page_id: str) -> httpx.Response:
+        return await self.request('GET', f'/pages/{page_id}')
+
+    async def create_page(self, data: dict) -> httpx.Response:
+        return await self.request('POST', '/pages', json=data, idempotent=False)
+
+    async def update_page(self, page_id: str, data: dict) -> httpx.Response:
+        return await self.request('PATCH', f'/pages/{page_id}', json=data)
+
+    async def delete_block(self, block_id: str) -> httpx.Response:
+        return await self.request('DELETE', f'/blocks/{block_id}')
+
+    async def aclose(self) -> None:
+        """
+        Closes connection pool
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> 'NotionClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+
+class WritePipeline:
+    def __init__(self, notion: NotionClient, concurrency: int = 3) -> None:
+        """
+        Runs notion writes concurrently, rate is limited by notion client
+
+        Args:
+            notion (NotionClient): shared Notion api client
+            concurrency (int): max writes in flight
+        """
+        self.notion = notion
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats = RequestStats()
+
+    def reset(self) -> RequestStats:
+        """
+        Starts new stats
+
+        Returns:
+            RequestStats: stats collected so far
+        """
+        stats, self.stats = self.stats, RequestStats()
+        return stats
+
+    async def write(self, method: str, path: str, json: Optional[dict] = None,
+                    idempotent: bool = True) -> Optional[httpx.Response]:
+        """
+        Sends one write request
+
+        Args:
+            method (str): http method
+            path (str): api path
+            json (dict): request body
+            idempotent (bool): request can be repeated after read timeout or 5xx
+
+        Returns:
+            Optional[httpx.Response]: response if write succeeded
+        """
+        async with self.semaphore:
+            try:
+                res = await self.notion.request(method, path, json=json, stats=self.stats,
+                                                idempotent=idempotent)
+            except httpx.HTTPError as e:
+                logging.warning(f"Notion {method} {path} failed with {e!r}")
+                self.stats.failed += 1
+                return None
+        if res.status_code == 200:
+            self.stats.succeeded += 1
+            return res
+        self.stats.failed += 1
+        return None
+
+    async def create_page(self, data: dict) -> Optional[httpx.Response]:
+        return await self.write('POST', '/pages', json=data, idempotent=False)
+
+    async def update_page(self, page_id: str, data: dict) -> Optional[httpx.Response]:
+        return await self.write('PATCH', f'/pages/{page_id}', json=data)
+
+    async def delete_block(self, block_id: str) -> Optional[httpx.Response]:
+        return await self.write('DELETE', f'/blocks/{block_id}')
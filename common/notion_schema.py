@@ -0,0 +1,181 @@
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Type
+
+from metrics import NOTION_ROWS_REJECTED
+
+
+# property value expressions by notion property type, prop is property object
+PROPERTY_VALUES: Dict[str, str] = {
+    'title': "prop['title'][0]['text']['content']",
+    'select': "prop['select']['name']",
+    'number': "prop['number']",
+    'formula': "prop['formula']['number']",
+    'date': "prop['date']['start']",
+    'date_end': "prop['date']['end']",
+    'number_or_select': "prop['number'] if prop.get('number') is not None else prop['select']['name']",
+}
+
+# errors of malformed property, anything else is a bug and is raised
+MISSING = (KeyError, IndexError, TypeError, ValueError)
+
+
+class Field:
+    __slots__ = ('prop', 'kind', 'required', 'default', 'convert')
+
+    def __init__(self, prop: str, kind: str, required: bool = False, default: Any = None,
+                 convert: Optional[Callable[[Any], Any]] = None) -> None:
+        """
+        Mapping of one record field to notion property
+
+        Args:
+            prop (str): notion property name, or page key for kind page
+            kind (str): property type, one of PROPERTY_VALUES or page
+            required (bool): row is rejected if property is missing
+            default (Any): value of missing optional property
+            convert (Callable[[Any], Any]): converts raw property value
+        """
+        if kind != 'page' and kind not in PROPERTY_VALUES:
+            raise ValueError(f"Unknown property type {kind}")
+        self.prop = prop
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.convert = convert
+
+
+class Rejected(Exception):
+    pass
+
+
+class Schema:
+    def __init__(self, name: str, record: Type, fields: Dict[str, Field]) -> None:
+        """
+        Declarative mapping of notion database properties to record fields
+
+        Args:
+            name (str): schema name used in logs and metrics
+            record (Type): record class built with fields as keyword arguments
+            fields (Dict[str, Field]): record field to notion property
+        """
+        self.name = name
+        self.record = record
+        self.fields = fields
+
+    def with_properties(self, renames: Dict[str, str]) -> 'Schema':
+        """
+        Get schema with renamed notion properties
+
+        Args:
+            renames (Dict[str, str]): record field to new notion property name
+
+        Returns:
+            Schema: new schema
+        """
+        fields = dict(self.fields)
+        for name, prop in renames.items():
+            field = fields[name]
+            fields[name] = Field(prop, field.kind, field.required, field.default, field.convert)
+        return Schema(self.name, self.record, fields)
+
+    def compile(self) -> 'Extractor':
+        return Extractor(self)
+
+
+class Extractor:
+    def __init__(self, schema: Schema) -> None:
+        """
+        Extractor compiled from schema into one python function, so rows are
+        read without per-field calls and missing properties raise no exceptions
+
+        Args:
+            schema (Schema): database schema
+        """
+        self.schema = schema
+        self.rejected = Counter()
+        self.extract_page = self._compile()
+
+    def _compile(self) -> Callable[[dict], Any]:
+        """
+        Generates extract_page function, which builds record from notion page
+        or raises Rejected if required property is missing
+        """
+        env = {'record': self.schema.record, 'Rejected': Rejected, 'MISSING': MISSING}
+        lines = ["def extract_page(page):", "    props = page['properties']"]
+        for i, (name, field) in enumerate(self.schema.fields.items()):
+            missing = f"raise Rejected({name!r})" if field.required else f"v{i} = default_{i}"
+            env[f'default_{i}'] = field.default
+            env[f'convert_{i}'] = field.convert
+            if field.kind == 'page':
+                lines.append(f"    v{i} = page.get({field.prop!r})")
+            else:
+                lines += [
+                    f"    prop = props.get({field.prop!r})",
+                    "    if prop is None:",
+                    f"        v{i} = None",
+                    "    else:",
+                    "        try:",
+                    f"            v{i} = {PROPERTY_VALUES[field.kind]}",
+                    "        except MISSING:",
+                    f"            v{i} = None",
+                ]
+            if field.convert is not None:
+                lines += [
+                    f"    if v{i} is not None:",
+                    "        try:",
+                    f"            v{i} = convert_{i}(v{i})",
+                    "        except MISSING:",
+                    f"            v{i} = None",
+                ]
+            lines += [f"    if v{i} is None:", f"        {missing}"]
+        # dataclass fields are in schema order, so record is built with positional arguments
+        if list(getattr(self.schema.record, '__slots__', ())) == list(self.schema.fields):
+            args = ', '.join(f"v{i}" for i in range(len(self.schema.fields)))
+        else:
+            args = ', '.join(f"{name}=v{i}" for i, name in enumerate(self.schema.fields))
+        lines.append(f"    return record({args})")
+        exec('\n'.join(lines), env)
+        return env['extract_page']
+
+    def extract(self, req_res: dict) -> list:
+        """
+        Extracts records from notion query result, rows without required
+        properties are skipped and counted
+
+        Args:
+            req_res (dict): notion query result
+
+        Returns:
+            list: records
+        """
+        ret = list()
+        rejected = Counter()
+        for page in req_res["results"]:
+            try:
+                ret.append(self.extract_page(page))
+            except Rejected as e:
+                rejected[e.args[0]] += 1
+        if rejected:
+            for name, count in rejected.items():
+                NOTION_ROWS_REJECTED.labels(self.schema.name, name).inc(count)
+            self.rejected.update(rejected)
+            logging.warning(f"Rejected {sum(rejected.values())} {self.schema.name} rows "
+                            f"without required properties: {dict(rejected)}")
+        return ret
+
+
+class Record:
+    """
+    Base of slotted dataclass records stored in mongo as plain documents
+    """
+    __slots__ = ()
+
+    def to_doc(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> 'Record':
+        """
+        Builds record from mongo document, unknown keys are ignored
+        """
+        return cls(**{name: doc.get(name) for name in cls.__slots__})
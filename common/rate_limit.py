@@ -0,0 +1,32 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """
+        Token bucket rate limiter
+
+        Args:
+            rate (float): tokens added per second
+            capacity (float): max burst, equals rate by default
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """
+        Waits until one token is available and takes it
+        """
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
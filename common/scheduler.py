@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+from datetime import datetime, time, timedelta, tzinfo
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from metrics import SCHEDULER_FAILURES, SCHEDULER_LAG_SECONDS
+
+
+def local_tz() -> tzinfo:
+    """
+    Get timezone from TZ environment variable or system local timezone
+
+    Returns:
+        tzinfo: timezone
+    """
+    if os.environ.get('TZ'):
+        return ZoneInfo(os.environ['TZ'])
+    return datetime.now().astimezone().tzinfo
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], Awaitable], tz: tzinfo, at: Optional[time] = None,
+                 every: Optional[timedelta] = None, misfire_grace: float = 3600) -> None:
+        """
+        Daily or interval job
+
+        Args:
+            name (str): unique job name, key of persisted state
+            func (Callable[[], Awaitable]): job coroutine function
+            tz (tzinfo): timezone of daily time
+            at (time): daily run time
+            every (timedelta): run interval
+            misfire_grace (float): max seconds a missed run is still caught up after restart
+        """
+        if (at is None) == (every is None):
+            raise ValueError("Job needs exactly one of at or every")
+        self.name = name
+        self.func = func
+        self.tz = tz
+        self.at = at
+        self.every = every
+        self.misfire_grace = misfire_grace
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Get first run time strictly after moment
+
+        Args:
+            moment (datetime): aware datetime
+
+        Returns:
+            datetime: aware run time
+        """
+        if self.every is not None:
+            return moment + self.every
+        moment = moment.astimezone(self.tz)
+        run = datetime.combine(moment.date(), self.at, tzinfo=self.tz)
+        if run <= moment:
+            run = datetime.combine(moment.date() + timedelta(days=1), self.at, tzinfo=self.tz)
+        return run
+
+
+class JobState:
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Last started run of every job kept in json file, so restart neither misses
+        nor repeats runs
+
+        Args:
+            path (str): state file, None keeps state in memory only
+        """
+        self.path = path
+        self._runs: Dict[str, str] = dict()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._runs = json.load(f)
+
+    def last_run(self, name: str) -> Optional[datetime]:
+        run = self._runs.get(name)
+        return datetime.fromisoformat(run) if run is not None else None
+
+    def save_run(self, name: str, run: datetime) -> None:
+        self._runs[name] = run.isoformat()
+        if self.path is None:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self._runs, f)
+        os.replace(tmp, self.path)
+
+
+class Scheduler:
+    def __init__(self, state_path: Optional[str] = None, tz: Optional[tzinfo] = None) -> None:
+        """
+        Sleeps until earliest deadline of min-heap of jobs, there are no periodic wake-ups
+
+        Args:
+            state_path (str): json file with last runs, None keeps state in memory only
+            tz (tzinfo): timezone of daily jobs, TZ or system local timezone by default
+        """
+        self.tz = tz or local_tz()
+        self.state = JobState(state_path)
+        self._heap: List[Tuple[datetime, int, Job]] = list()
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks = set()
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def first_run(self, job: Job) -> datetime:
+        """
+        Get first run time of job after start, latest missed run is caught up
+        once if it is within misfire grace
+
+        Args:
+            job (Job): job
+
+        Returns:
+            datetime: first run time
+        """
+        now = self.now()
+        last = self.state.last_run(job.name)
+        if last is None:
+            return job.next_after(now)
+        run = job.next_after(last)
+        if run > now:
+            return run
+        while job.next_after(run) <= now:
+            run = job.next_after(run)
+        if (now - run).total_seconds() <= job.misfire_grace:
+            logging.info(f"Catching up job {job.name} missed at {run}")
+            return run
+        return job.next_after(now)
+
+    def add(self, job: Job) -> Job:
+        run = self.first_run(job)
+        heapq.heappush(self._heap, (run, next(self._counter), job))
+        self._wakeup.set()
+        logging.info(f"Scheduled job {job.name} at {run}")
+        return job
+
+    def daily(self, name: str, at: str, func: Callable[[], Awaitable], misfire_grace: float = 3600) -> Job:
+        """
+        Adds job running every day at local time
+
+        Args:
+            name (str): unique job name
+            at (str): time, e.g. 11:30
+            func (Callable[[], Awaitable]): job coroutine function
+            misfire_grace (float): max seconds a missed run is still caught up after restart
+
+        Returns:
+            Job: job
+        """
+        return self.add(Job(name, func, self.tz, at=time.fromisoformat(at), misfire_grace=misfire_grace))
+
+    def every(self, name: str, interval: timedelta, func: Callable[[], Awaitable],
+              misfire_grace: float = 3600) -> Job:
+        """
+        Adds job running every interval
+
+        Args:
+            name (str): unique job name
+            interval (timedelta): run interval
+            func (Callable[[], Awaitable]): job coroutine function
+            misfire_grace (float): max seconds a missed run is still caught up after restart
+
+        Returns:
+            Job: job
+        """
+        return self.add(Job(name, func, self.tz, every=interval, misfire_grace=misfire_grace))
+
+    async def _run_job(self, job: Job) -> None:
+        try:
+            await job.func()
+        except Exception:
+            SCHEDULER_FAILURES.labels(job.name).inc()
+            logging.exception(f"Job {job.name} failed")
+
+    def _start(self, run: datetime, job: Job) -> None:
+        lag = (self.now() - run).total_seconds()
+        SCHEDULER_LAG_SECONDS.labels(job.name).observe(lag)
+        logging.info(f"Running job {job.name} scheduled at {run}, lag {lag:.3f} s")
+        # state is saved before run, crashed run is not repeated after restart
+        self.state.save_run(job.name, run)
+        task = asyncio.create_task(self._run_job(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        next_run = job.next_after(run)
+        if next_run <= self.now():
+            next_run = job.next_after(self.now())
+        heapq.heappush(self._heap, (next_run, next(self._counter), job))
+
+    async def run(self) -> None:
+        """
+        Runs due jobs forever, each job runs in its own task
+        """
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            run, _, job = self._heap[0]
+            delay = (run - self.now()).total_seconds()
+            if delay > 0:
+                # new job may be due earlier, wall clock deadline is checked again after sleep
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            self._start(run, job)
@@ -0,0 +1,111 @@
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+'''
+ Users Structure (notifier.users)
+    {
+        "_id": 123456789, telegram chat id
+        "series_db": "notion-database-id",
+        "subs_db": "notion-database-id",
+        "registered": "2022-07-08T10:00:00" BSON date
+    }
+
+'''
+
+
+NOTION_ID = re.compile(r'[0-9a-f]{32}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def parse_notion_id(text: str) -> Optional[str]:
+    """
+    Validates notion database id, 32 hex digits with or without dashes
+
+    Args:
+        text (str): id typed by user
+
+    Returns:
+        Optional[str]: id as 32 lowercase hex digits, None if text is not an id
+    """
+    text = text.strip().lower()
+    if NOTION_ID.fullmatch(text) is None:
+        return None
+    return text.replace('-', '')
+
+
+class UserRegistry:
+    def __init__(self, mongo_client: AsyncIOMotorClient, ttl: float = 300, max_cached: int = 10000) -> None:
+        """
+        Registered users and their notion databases, users are cached in memory
+        so commands and inline queries do not query mongo on every update
+
+        Args:
+            mongo_client (AsyncIOMotorClient): shared motor client
+            ttl (float): seconds user is cached, bounds staleness after registration on other replica
+            max_cached (int): max cached users, anyone can send inline queries
+        """
+        self.db = mongo_client.notifier['users']
+        self.ttl = ttl
+        self.max_cached = max_cached
+        # chat id to cache time and user, None for unknown users
+        self._cache: Dict[int, Tuple[float, Optional[dict]]] = dict()
+
+    async def register(self, chat_id: int, series_db: Optional[str] = None, subs_db: Optional[str] = None) -> None:
+        """
+        Registers user or updates its databases
+
+        Args:
+            chat_id (int): telegram chat id
+            series_db (str): notion series database id
+            subs_db (str): notion subscriptions database id
+        """
+        data = {'registered': datetime.now()}
+        if series_db is not None:
+            data['series_db'] = series_db
+        if subs_db is not None:
+            data['subs_db'] = subs_db
+        await self.db.update_one({'_id': chat_id}, {'$set': data}, upsert=True)
+        self._cache.pop(chat_id, None)
+
+    async def unregister(self, chat_id: int) -> None:
+        await self.db.delete_one({'_id': chat_id})
+        self._cache.pop(chat_id, None)
+
+    async def get(self, chat_id: int) -> Optional[dict]:
+        """
+        Get user, read from mongo at most once per ttl
+
+        Args:
+            chat_id (int): telegram chat id
+
+        Returns:
+            Optional[dict]: user, None if user is not registered
+        """
+        cached = self._cache.get(chat_id)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        user = await self.db.find_one({'_id': chat_id})
+        if len(self._cache) >= self.max_cached:
+            self._cache.clear()
+        self._cache[chat_id] = (time.monotonic(), user)
+        return user
+
+    async def group_by(self, field: str) -> Dict[str, List[int]]:
+        """
+        Groups users by one of their databases
+
+        Args:
+            field (str): series_db or subs_db
+
+        Returns:
+            Dict[str, List[int]]: notion database id to chat ids
+        """
+        cursor = self.db.aggregate([
+            {'$match': {field: {'$ne': None}}},
+            {'$group': {'_id': f'${field}', 'chats': {'$push': '$_id'}}},
+        ])
+        return {group['_id']: group['chats'] async for group in cursor}
@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Awaitable, Callable
+
+
+class DigestCache:
+    def __init__(self, generation: Callable[[], int]) -> None:
+        """
+        Cache of rendered digests keyed by command and calendar day,
+        entries are dropped when sync generation or day changes
+
+        Args:
+            generation (Callable[[], int]): returns current sync generation
+        """
+        self.generation = generation
+        self._day = date.today()
+        self._generation = generation()
+        self._entries = dict()
+
+    def _evict_stale(self) -> None:
+        """
+        Clears cache if day or sync generation changed
+        """
+        today_ = date.today()
+        generation = self.generation()
+        if today_ != self._day or generation != self._generation:
+            self._entries.clear()
+            self._day = today_
+            self._generation = generation
+
+    async def get(self, command: str, render: Callable[[], Awaitable[str]]) -> str:
+        """
+        Returns cached digest or renders and caches it
+
+        Args:
+            command (str): command name, e.g. today
+            render (Callable[[], Awaitable[str]]): renders digest from db
+
+        Returns:
+            str: rendered digest
+        """
+        self._evict_stale()
+        if command in self._entries:
+            return self._entries[command]
+
+        generation = self._generation
+        text = await render()
+        # sync could finish while rendering, then result may be already stale
+        self._evict_stale()
+        if generation == self._generation:
+            self._entries[command] = text
+        return text
@@ -0,0 +1,119 @@
+import logging
+import os
+import sys
+from datetime import timedelta
+
+import pymongo
+from pymongo import IndexModel
+
+from mongo_series import SeriesMongo
+from release_calendar import ReleaseCalendar
+
+
+SERIES_INDEXES = [
+    # calendar rebuild reads watched series by status and is_finished, delta sync
+    # range-scans passed next_serie_date of them, get_wanted uses status prefix
+    IndexModel([('status', pymongo.ASCENDING), ('is_finished', pymongo.ASCENDING),
+                ('next_serie_date', pymongo.ASCENDING)], name='status_finished_next_date'),
+]
+
+
+CALENDAR_INDEXES = [
+    # every calendar command is a range read on date
+    IndexModel([('date', pymongo.ASCENDING)], name='date'),
+    # update_series removes stale occurrences of changed series after every webhook event
+    IndexModel([('series_id', pymongo.ASCENDING)], name='series_id'),
+]
+
+
+async def ensure_indexes(mongo_client, db_name: str = 'series') -> None:
+    """
+    Creates series and calendar collections indexes, does nothing if they already exist.
+    Collections are never dropped by sync, so indexes persist
+
+    Args:
+        mongo_client (AsyncIOMotorClient): shared motor client
+        db_name (str): mongo database holding series of one notion database
+    """
+    names = await mongo_client[db_name]['series'].create_indexes(SERIES_INDEXES)
+    names += await mongo_client[db_name]['calendar'].create_indexes(CALENDAR_INDEXES)
+    logging.info(f"Ensured {db_name} indexes {names}")
+
+
+def plan_stages(plan: dict) -> list:
+    """
+    Collects all stages of query plan
+
+    Args:
+        plan (dict): winning plan from explain()
+
+    Returns:
+        list: stage names
+    """
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for sub in plan.get('inputStages', []):
+        stages += plan_stages(sub)
+    return stages
+
+
+def check_query_plans(series_db: SeriesMongo) -> dict:
+    """
+    Runs explain() on every query bot commands and syncs run: calendar range reads,
+    wanted, watched and due series finds and calendar update after webhook events
+
+    Args:
+        series_db (SeriesMongo): series db
+
+    Returns:
+        dict: getter name to its plan stages for getters doing COLLSCAN
+    """
+    today = series_db.today()
+    ranges = {
+        'get_today': (today, today),
+        'get_tommorow': (today + timedelta(days=1), today + timedelta(days=1)),
+        'get_next_week': series_db.next_week(),
+        'get_this_week': series_db.this_week(),
+        'get_month': series_db.this_month(),
+        'get_digest': series_db.digest_range(),
+    }
+    plans = dict()
+    for name, (start, end) in ranges.items():
+        cursor = series_db.calendar.find(series_db.range_query(start, end)).sort('date', pymongo.ASCENDING)
+        plans[name] = plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+    series_queries = {
+        'get_wanted': series_db.wanted_query(),
+        'calendar_rebuild': series_db.watched_query(),
+        'delta_sync_due': series_db.due_query(today),
+    }
+    for name, query in series_queries.items():
+        plans[name] = plan_stages(series_db.db.find(query).explain()['queryPlanner']['winningPlan'])
+    cursor = series_db.calendar.find(ReleaseCalendar.stale_query(['serie-id'], ['serie-id:2022-07-15']))
+    plans['update_series'] = plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+    return {name: stages for name, stages in plans.items() if 'COLLSCAN' in stages}
+
+
+def assert_no_collscan(series_db: SeriesMongo) -> None:
+    """
+    Fails if any bot query scans whole collection
+
+    Args:
+        series_db (SeriesMongo): series db
+    """
+    series_db.db.create_indexes(SERIES_INDEXES)
+    series_db.calendar.create_indexes(CALENDAR_INDEXES)
+    failed = check_query_plans(series_db)
+    assert not failed, f"Queries doing COLLSCAN: {failed}"
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        assert_no_collscan(SeriesMongo(os.environ['CON_STRING']))
+    except AssertionError as e:
+        logging.error(e)
+        sys.exit(1)
+    logging.info("All series queries use indexes")
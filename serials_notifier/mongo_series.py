@@ -1,12 +1,17 @@
+import asyncio
 import pymongo
 from datetime import datetime, time, timedelta
-from typing import Tuple
+from typing import Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from metrics import MONGO_QUERY_SECONDS, timed
 
 
 '''
  DB Structure
     {
-        "_id": ObjectId("1234567890"),
+        "_id": "notion-page-id",
         "name": "Истребитель демонов 2",
         "season": 2,
         "status": "Смотрю", ["Смотрю", "Хочу посмотреть", "Просмотренно"]
@@ -30,16 +35,10 @@ NUM_TO_DAY = {
 }
 
 
-class SeriesMongo:
-    def __init__(self, con_string: str) -> None:
-        """
-        Init DB
-        Args:
-            con_string (str): MongoDB connection string
-        """
-
-        self.mongo_client = pymongo.MongoClient(con_string)
-        self.db = self.mongo_client.series['series']
+class SeriesQueries:
+    """
+    Queries and rendering of series notifications shared by sync and async clients
+    """
 
     @staticmethod
     def today() -> datetime:
@@ -78,11 +77,93 @@ class SeriesMongo:
         sunday = monday + timedelta(days=6)
         return (monday, sunday)
 
-    def get_today(self) -> str:
+    @staticmethod
+    def this_month() -> Tuple[datetime, datetime]:
+        """
+        Get this month interval [first day, last day]
+
+        Returns:
+            Tuple[date, date]: Returns this month interval [first day, last day]
+        """
+        first = datetime.combine(datetime.now().date().replace(day=1), time(0, 0, 0))
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return (first, last)
+
+    def wanted_query(self) -> dict:
+        return {'status': 'Хочу посмотреть'}
+
+    @staticmethod
+    def watched_query() -> dict:
+        return {'status': 'Смотрю', 'is_finished': {'$ne': 'Да'}}
+
+    @staticmethod
+    def due_query(now: datetime) -> dict:
+        return {'status': 'Смотрю', 'is_finished': 'Нет', 'next_serie_date': {'$lt': now}}
+
+    @staticmethod
+    def range_query(start: datetime, end: datetime) -> dict:
+        return {'date': {'$gte': start, '$lte': end}}
+
+    def digest_range(self) -> Tuple[datetime, datetime]:
+        """
+        Get calendar interval read by digest [this week monday, next week sunday],
+        it covers today, tommorow, this week and next week
+
+        Returns:
+            Tuple[datetime, datetime]: digest interval
+        """
+        return (self.this_week()[0], self.next_week()[1])
+
+    def split_views(self, occurrences: list, wanted: list) -> dict:
+        """
+        Splits release occurrences of digest range into calendar views,
+        every view gets same occurrences as its own command
+
+        Args:
+            occurrences (list): release occurrences of digest_range sorted by date
+            wanted (list): wanted series
+
+        Returns:
+            dict: series of every view
+        """
+        today = self.today()
+        tommorow = today + timedelta(days=1)
+
+        def within(start: datetime, end: datetime) -> list:
+            return [item for item in occurrences if start <= item['next_serie_date'] <= end]
+
+        return {
+            'today': within(today, today),
+            'tommorow': within(tommorow, tommorow),
+            'this_week': within(*self.this_week()),
+            'next_week': within(*self.next_week()),
+            'wanted': wanted,
+        }
+
+    def render_digest(self, views: dict) -> str:
+        """
+        Creates notification string with all calendar views
+
+        Args:
+            views (dict): series of every view from split_views
+
+        Returns:
+            str: notification string with all calendar views
+        """
+        return "\n\n".join([self.render_today(views['today']),
+                             self.render_tommorow(views['tommorow']),
+                             self.render_this_week(views['this_week']),
+                             self.render_next_week(views['next_week']),
+                             self.render_wanted(views['wanted'])])
+
+    def render_today(self, list_series: list) -> str:
         """
 
         Creates notification string for series that come out today
 
+        Args:
+            list_series (list): series that come out today
+
         Returns:
             str: notification string for series that come out today
         """
@@ -90,10 +171,6 @@ class SeriesMongo:
         text = f"#Сериалы \n\nСегодня выходят следующие сериалы:\n\n"
         space = "  "
 
-        cursor = self.db.find(
-            {'status': 'Смотрю', 'is_finished': {'$ne': 'Да'}, 'next_serie_date': {"$eq": self.today()}}).sort("next_serie_date", pymongo.ASCENDING)
-
-        list_series = list(cursor)
         if len(list_series) == 0:
             return "Сегодня ничего не выходит =("
 
@@ -102,30 +179,20 @@ class SeriesMongo:
 
         return text
 
-    def get_tommorow(self) -> str:
+    def render_tommorow(self, list_series: list) -> str:
         """
         Creates notification string for series that come out tommorow
 
-        Returns:
-            str: notification string for series that come out tommorow
-        """
-
-        """
-
-        Creates notification string for series that come out today
+        Args:
+            list_series (list): series that come out tommorow
 
         Returns:
-            str: notification string for series that come out today
+            str: notification string for series that come out tommorow
         """
 
         text = f"#Сериалы \n\nЗавтра выходят следующие сериалы:\n\n"
         space = "  "
 
-        cursor = self.db.find(
-            {'status': 'Смотрю', 'is_finished': {'$ne': 'Да'}, 'next_serie_date': {"$eq": self.today() + timedelta(days=1)}}).sort("next_serie_date", pymongo.ASCENDING)
-
-        list_series = list(cursor)
-
         if len(list_series) == 0:
             return "Завтра ничего не выходит =("
 
@@ -134,10 +201,13 @@ class SeriesMongo:
 
         return text
 
-    def get_next_week(self) -> str:
+    def render_next_week(self, list_series: list) -> str:
         """
         Creates notification string for series that come out next week
 
+        Args:
+            list_series (list): series that come out next week
+
         Returns:
             str: notification string for series that come out next week
         """
@@ -145,12 +215,6 @@ class SeriesMongo:
         text = f"#Сериалы \n\nНа следующей неделе выходят:\n\n"
         space = "  "
 
-        mon, sun = self.next_week()
-        cursor = self.db.find(
-            {'status': 'Смотрю', 'is_finished': {'$ne': 'Да'}, 'next_serie_date': {"$gte": mon, "$lte": sun}}).sort("next_serie_date", pymongo.ASCENDING)
-
-        list_series = list(cursor)
-
         if len(list_series) == 0:
             return "На следующей неделе ничего не выходит =("
 
@@ -159,10 +223,13 @@ class SeriesMongo:
 
         return text
 
-    def get_this_week(self) -> str:
+    def render_this_week(self, list_series: list) -> str:
         """
         Creates notification string for series that come out this week
 
+        Args:
+            list_series (list): series that come out this week
+
         Returns:
             str: notification string for series that come out this week
         """
@@ -174,16 +241,6 @@ class SeriesMongo:
         if_already = False
 
         mon, sun = self.this_week()
-        cursor = self.db.find({"$and": [
-            {'status': 'Смотрю'},
-            {'is_finished': {'$ne': 'Да'}},
-            {"$or": [
-                {'next_serie_date': {"$gte": mon, "$lte": sun}},
-                {'next_serie_date': {
-                    "$gte": mon + timedelta(days=7), "$lt": self.today() + timedelta(days=7)}}]}
-        ]}).sort("next_serie_date", pymongo.ASCENDING)
-
-        list_series = list(cursor)
 
         if len(list_series) == 0:
             return "На этой неделе ничего не выходит =("
@@ -200,21 +257,42 @@ class SeriesMongo:
             return intro + already_text + "\n\n" + text
         return intro + text
 
-    def get_wanted(self) -> str:
+    def render_month(self, list_series: list) -> str:
         """
-        Creates notification string for series that come out this week
+        Creates notification string for series that come out this month
+
+        Args:
+            list_series (list): release occurrences of this month
 
         Returns:
-            str: notification string for series that come out this week
+            str: notification string for series that come out this month
         """
 
-        intro = "#Сериалы \n\n"
-        text = f"Вот ожидаемые сериалы:\n\n"
+        text = f"#Сериалы \n\nВ этом месяце выходят:\n\n"
         space = "  "
 
-        cursor = self.db.find({'status': 'Хочу посмотреть'})
+        if len(list_series) == 0:
+            return "В этом месяце ничего не выходит =("
+
+        for item in list_series:
+            text += f"{space}{item['next_serie_date'].strftime('%d.%m')} {item['name']} \n"
+
+        return text
+
+    def render_wanted(self, list_series: list) -> str:
+        """
+        Creates notification string for series user wants to watch
+
+        Args:
+            list_series (list): wanted series
 
-        list_series = list(cursor)
+        Returns:
+            str: notification string for series user wants to watch
+        """
+
+        intro = "#Сериалы \n\n"
+        text = f"Вот ожидаемые сериалы:\n\n"
+        space = "  "
 
         if len(list_series) == 0:
             return "Список ожидаемых пуст =("
@@ -229,3 +307,164 @@ class SeriesMongo:
             elif item['date_release'] > self.today():
                 text += f"{space}{item['name']} выходит {item['date_release'].date()} \n \n"
         return intro + text
+
+    @staticmethod
+    def describe_found(item) -> str:
+        """
+        Creates short description of found serie: season, status and next serie date
+
+        Args:
+            item (Series): serie from name index
+
+        Returns:
+            str: description
+        """
+        parts = list()
+        if item.season is not None:
+            parts.append(f"сезон {int(item.season)}")
+        parts.append(item.status)
+        if item.status == 'Смотрю':
+            if item.is_finished == 'Да':
+                parts.append("сезон закончен")
+            elif item.next_serie_date is not None:
+                parts.append(f"следующая серия {item.next_serie_date.strftime('%d.%m.%Y')}")
+        elif item.date_release is not None and item.date_release > SeriesQueries.today():
+            parts.append(f"выходит {item.date_release.strftime('%d.%m.%Y')}")
+        return ', '.join(parts)
+
+    def render_found(self, list_series: list, query: str) -> str:
+        """
+        Creates string with series found by name
+
+        Args:
+            list_series (list): series from name index, best matches first
+            query (str): search query
+
+        Returns:
+            str: found series string
+        """
+
+        text = f"#Сериалы \n\nПо запросу «{query}» найдено:\n\n"
+        space = "  "
+
+        if len(list_series) == 0:
+            return f"По запросу «{query}» ничего не найдено =("
+
+        for item in list_series:
+            text += f"{space}{item.name} — {self.describe_found(item)} \n"
+
+        return text
+
+
+class SeriesMongo(SeriesQueries):
+    def __init__(self, con_string: Optional[str] = None, mongo_client: Optional[pymongo.MongoClient] = None,
+                 db_name: str = 'series') -> None:
+        """
+        Init DB
+        Args:
+            con_string (str): MongoDB connection string
+            mongo_client (pymongo.MongoClient): already opened client to share
+            db_name (str): mongo database holding series of one notion database
+        """
+
+        self.mongo_client = mongo_client or pymongo.MongoClient(con_string)
+        self.db = self.mongo_client[db_name]['series']
+        self.calendar = self.mongo_client[db_name]['calendar']
+
+    def get_range(self, start: datetime, end: datetime) -> list:
+        """
+        Reads release occurrences within [start, end] from materialised calendar
+
+        Args:
+            start (datetime): interval start
+            end (datetime): interval end
+
+        Returns:
+            list: series with next_serie_date set to occurrence date
+        """
+        cursor = self.calendar.find(self.range_query(start, end),
+                                    {'_id': 0, 'name': 1, 'date': 1}).sort('date', pymongo.ASCENDING)
+        return [{'name': item['name'], 'next_serie_date': item['date']} for item in cursor]
+
+    def get_digest(self) -> str:
+        return self.render_digest(self.split_views(self.get_range(*self.digest_range()),
+                                                   list(self.db.find(self.wanted_query()))))
+
+    def get_today(self) -> str:
+        return self.render_today(self.get_range(self.today(), self.today()))
+
+    def get_tommorow(self) -> str:
+        tommorow = self.today() + timedelta(days=1)
+        return self.render_tommorow(self.get_range(tommorow, tommorow))
+
+    def get_next_week(self) -> str:
+        return self.render_next_week(self.get_range(*self.next_week()))
+
+    def get_this_week(self) -> str:
+        return self.render_this_week(self.get_range(*self.this_week()))
+
+    def get_month(self) -> str:
+        return self.render_month(self.get_range(*self.this_month()))
+
+    def get_wanted(self) -> str:
+        return self.render_wanted(list(self.db.find(self.wanted_query())))
+
+
+class AsyncSeriesMongo(SeriesQueries):
+    def __init__(self, mongo_client: AsyncIOMotorClient, db_name: str = 'series') -> None:
+        """
+        Init DB, queries run on event loop without blocking it
+        Args:
+            mongo_client (AsyncIOMotorClient): shared motor client
+            db_name (str): mongo database holding series of one notion database
+        """
+
+        self.mongo_client = mongo_client
+        self.db = self.mongo_client[db_name]['series']
+        self.calendar = self.mongo_client[db_name]['calendar']
+
+    async def get_range(self, start: datetime, end: datetime) -> list:
+        """
+        Reads release occurrences within [start, end] from materialised calendar
+
+        Args:
+            start (datetime): interval start
+            end (datetime): interval end
+
+        Returns:
+            list: series with next_serie_date set to occurrence date
+        """
+        cursor = self.calendar.find(self.range_query(start, end),
+                                    {'_id': 0, 'name': 1, 'date': 1}).sort('date', pymongo.ASCENDING)
+        return [{'name': item['name'], 'next_serie_date': item['date']} async for item in cursor]
+
+    @timed(MONGO_QUERY_SECONDS, 'digest')
+    async def get_digest(self) -> str:
+        occurrences, wanted = await asyncio.gather(self.get_range(*self.digest_range()),
+                                                   self.db.find(self.wanted_query()).to_list(None))
+        return self.render_digest(self.split_views(occurrences, wanted))
+
+    @timed(MONGO_QUERY_SECONDS, 'today')
+    async def get_today(self) -> str:
+        return self.render_today(await self.get_range(self.today(), self.today()))
+
+    @timed(MONGO_QUERY_SECONDS, 'tommorow')
+    async def get_tommorow(self) -> str:
+        tommorow = self.today() + timedelta(days=1)
+        return self.render_tommorow(await self.get_range(tommorow, tommorow))
+
+    @timed(MONGO_QUERY_SECONDS, 'next_week')
+    async def get_next_week(self) -> str:
+        return self.render_next_week(await self.get_range(*self.next_week()))
+
+    @timed(MONGO_QUERY_SECONDS, 'this_week')
+    async def get_this_week(self) -> str:
+        return self.render_this_week(await self.get_range(*self.this_week()))
+
+    @timed(MONGO_QUERY_SECONDS, 'month')
+    async def get_month(self) -> str:
+        return self.render_month(await self.get_range(*self.this_month()))
+
+    @timed(MONGO_QUERY_SECONDS, 'wanted')
+    async def get_wanted(self) -> str:
+        return self.render_wanted(await self.db.find(self.wanted_query()).to_list(None))
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from aiohttp import web
+
+from notion_api import NotionClient
+from tenants import SeriesTenant, Tenants
+
+
+SIGNATURE_HEADER = 'X-Notion-Signature'
+VERIFICATION_TOKEN = re.compile(r'[\w-]{1,128}')
+PAGE_EVENTS = {'page.created', 'page.properties_updated', 'page.content_updated',
+               'page.moved', 'page.undeleted', 'page.deleted'}
+
+
+def verify_signature(body: bytes, signature: str, token: str) -> bool:
+    """
+    Checks notion webhook signature, sha256 hmac of raw body with verification token
+
+    Args:
+        body (bytes): raw request body
+        signature (str): X-Notion-Signature header, e.g. sha256=abcd
+        token (str): subscription verification token
+
+    Returns:
+        bool: True if signature is valid
+    """
+    expected = 'sha256=' + hmac.new(token.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+def normalize_id(notion_id: str) -> str:
+    return notion_id.replace('-', '').lower()
+
+
+class NotionEventReceiver:
+    def __init__(self, notion: NotionClient, tenants: Tenants, db_ids: Callable[[], Awaitable[Iterable[str]]],
+                 token: Optional[str] = None, debounce: float = 2.0) -> None:
+        """
+        Receives notion webhook events and syncs only affected pages,
+        events within debounce window are merged into one flush
+
+        Args:
+            notion (NotionClient): shared Notion api client
+            tenants (Tenants): series tenants
+            db_ids (Callable[[], Awaitable[Iterable[str]]]): series databases served by bot
+            token (str): verification token, None accepts only verification request which sends it
+            debounce (float): seconds events are collected before flush
+        """
+        self.notion = notion
+        self.tenants = tenants
+        self.db_ids = db_ids
+        self.token = token
+        self.debounce = debounce
+        # pages are refetched on flush, so deletion is confirmed by notion and not by event
+        self._pending: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        Webhook endpoint, events are acked at once and synced after debounce window
+        """
+        body = await request.read()
+        try:
+            event = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+
+        if self.token is None:
+            # sent once when subscription is created, token is set as NOTION_WEBHOOK_TOKEN
+            token = event.get('verification_token') if isinstance(event, dict) else None
+            if not isinstance(token, str) or VERIFICATION_TOKEN.fullmatch(token) is None:
+                logging.warning("Rejected notion event, NOTION_WEBHOOK_TOKEN is not set")
+                return web.Response(status=403)
+            logging.warning(f"Notion webhook verification token: {token}")
+            return web.Response(status=200)
+        if not verify_signature(body, request.headers.get(SIGNATURE_HEADER), self.token):
+            logging.warning("Rejected notion event with wrong signature")
+            return web.Response(status=401)
+        if not isinstance(event, dict):
+            return web.Response(status=400)
+
+        self.add(event)
+        return web.Response(status=200)
+
+    def add(self, event: dict) -> None:
+        """
+        Queues page of event for next flush
+
+        Args:
+            event (dict): notion webhook event
+        """
+        entity = event.get('entity') or dict()
+        if event.get('type') not in PAGE_EVENTS or entity.get('type') != 'page':
+            return
+        self._pending.add(entity['id'])
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        # events received during flush are flushed by next iteration
+        while self._pending:
+            await asyncio.sleep(self.debounce)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Failed to sync pages from notion events")
+
+    async def _resolve(self) -> Dict[str, SeriesTenant]:
+        return {normalize_id(db_id): self.tenants.get(db_id) for db_id in await self.db_ids()}
+
+    async def flush(self) -> int:
+        """
+        Syncs queued pages, every page is refetched, so changed pages are upserted
+        and pages notion reports missing, archived or trashed are removed from every tenant.
+        Pages which failed to be retrieved are queued for next flush
+
+        Returns:
+            int: number of changed mongo documents
+        """
+        pending, self._pending = self._pending, set()
+        if not pending:
+            return 0
+        tenants = await self._resolve()
+        deleted = list()
+        failed = list()
+
+        changed: Dict[str, list] = dict()
+        page_ids = list(pending)
+        responses = await asyncio.gather(*[self.notion.retrieve_page(page_id) for page_id in page_ids],
+                                         return_exceptions=True)
+        for page_id, res in zip(page_ids, responses):
+            if isinstance(res, Exception):
+                logging.warning(f"Failed to retrieve page {page_id} of notion event: {res!r}")
+                failed.append(page_id)
+                continue
+            if res.status_code == 404:
+                deleted.append(page_id)
+                continue
+            if res.status_code != 200:
+                continue
+            page = res.json()
+            if page.get('archived') or page.get('in_trash'):
+                deleted.append(page['id'])
+                continue
+            db_id = normalize_id(page.get('parent', {}).get('database_id') or '')
+            if db_id in tenants:
+                changed.setdefault(db_id, []).append(page)
+        # retrieved pages are synced below, failed ones are retried by next flush
+        self._pending.update(failed)
+
+        rows = 0
+        for db_id, pages in changed.items():
+            rows += await tenants[db_id].updater.sync_pages(pages)
+        if deleted:
+            for tenant in tenants.values():
+                rows += await tenant.updater.delete_pages(deleted)
+        logging.info(f"Flushed {len(pending) - len(failed)} pages from notion events, {rows} rows changed")
+        return rows
+
+
+def make_events_app(receiver: NotionEventReceiver, path: str = '/notion') -> web.Application:
+    """
+    Builds aiohttp application receiving notion webhook events
+
+    Args:
+        receiver (NotionEventReceiver): event receiver
+        path (str): endpoint path
+
+    Returns:
+        web.Application: application
+    """
+    app = web.Application()
+    app.router.add_post(path, receiver.handle)
+    return app
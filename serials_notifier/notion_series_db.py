@@ -1,5 +1,12 @@
-import requests
-from datetime import datetime, time
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from notion_api import NotionClient
+from notion_schema import Field, Record, Schema
+from release_dates import DEFAULT_CADENCE, parse_cadence
 
 
 NUM_TO_DAY = {
@@ -15,25 +22,61 @@ NUM_TO_DAY = {
 
 def to_datetime(date_: str) -> datetime:
     """
-    Transforms string date to datetime
+    Transforms string date to datetime at midnight, time part of notion datetime is dropped
     Args:
         date_ (str): string date
 
     Returns:
         datetime: datetime from string
     """
-    return datetime.combine(datetime.strptime(date_, "%Y-%m-%d").date(), time(0, 0, 0))
+    return datetime.fromisoformat(date_[:10])
+
+
+@dataclass(slots=True)
+class Series(Record):
+    _id: str
+    name: str
+    status: str
+    last_edited_time: Optional[str] = None
+    season: Optional[int] = None
+    is_finished: str = "Нет"
+    date_release: Optional[datetime] = None
+    next_serie_date: Optional[datetime] = None
+    type: Optional[str] = None
+    cadence: int = DEFAULT_CADENCE
+    hiatus_start: Optional[datetime] = None
+    hiatus_end: Optional[datetime] = None
+
+
+SERIES_SCHEMA = Schema('series', Series, {
+    "_id": Field("id", 'page', required=True),
+    "name": Field("Название", 'title', required=True),
+    "status": Field("Статус", 'select', required=True),
+    "last_edited_time": Field("last_edited_time", 'page'),
+    "season": Field("Сезон", 'number'),
+    "is_finished": Field("Закончен сезон?", 'select', default="Нет"),
+    "date_release": Field("Дата выхода", 'date', convert=to_datetime),
+    "next_serie_date": Field("Следующая серия выйдет", 'date', convert=to_datetime),
+    "type": Field("Тип", 'select'),
+    "cadence": Field("Периодичность", 'number_or_select', default=DEFAULT_CADENCE, convert=parse_cadence),
+    "hiatus_start": Field("Перерыв", 'date', convert=to_datetime),
+    "hiatus_end": Field("Перерыв", 'date_end', convert=to_datetime),
+})
+
+# renamed notion properties, e.g. {"name": "Title"}
+SERIES_EXTRACTOR = SERIES_SCHEMA.with_properties(
+    json.loads(os.environ.get('SERIES_PROPERTIES', '{}'))).compile()
 
 
 class SeriesNotion:
-    def __init__(self, api_key: str, db_id: str) -> None:
+    def __init__(self, notion: NotionClient, db_id: str) -> None:
         """
         Init class
         Args:
-            api_key (str): Notion api key string
+            notion (NotionClient): shared Notion api client
             db_id (str): Notion database id string
         """
-        self.api_key = api_key
+        self.notion = notion
         self.db_id = db_id
 
     @staticmethod
@@ -44,59 +87,34 @@ class SeriesNotion:
             req_res (list): Request result from notion api
 
         Returns:
-            list: aggregated data from series database
+            list: series records from series database
         """
-        ret = list()
-        for el in req_res["results"]:
-            try:
-                tmp = el["properties"]
-                sup = {
-                    "_id": el["id"],
-                    "name": tmp["Название"]["title"][0]["text"]["content"],
-                    "status": tmp["Статус"]["select"]["name"],
-                }
-                try:
-                    sup["season"] = tmp["Сезон"]["number"]
-                except:
-                    sup["season"] = None
-                try:
-                    sup["is_finished"] = tmp["Закончен сезон?"]["select"]["name"]
-                except:
-                    sup["is_finished"] = "Нет"
-                try:
-                    sup["date_release"] = to_datetime(
-                        tmp["Дата выхода"]["date"]["start"])
-                except:
-                    sup["date_release"] = None
-
-                try:
-                    sup["next_serie_date"] = to_datetime(
-                        tmp["Следующая серия выйдет"]["date"]["start"])
-                except:
-                    sup["next_serie_date"] = None
-
-                try:
-                    sup["type"] = tmp["Тип"]["select"]["name"]
-                except:
-                    sup["type"] = None
-                ret.append(sup)
-            except:
-                continue
-        return ret
+        return SERIES_EXTRACTOR.extract(req_res)
+
+    async def iter_series(self, query: Optional[dict] = None) -> AsyncIterator[list]:
+        """
+        Streams series database page by page
 
-    def get_series(self) -> list:
-        """_summary_
+        Args:
+            query (dict): optional notion query body (filter, sorts)
 
-        Sends post request to notion api to get data from series database
+        Yields:
+            list: parsed series of one page
+        """
+        async for page in self.notion.iter_query(self.db_id, query):
+            yield self.extract_data(page)
+
+    async def get_series(self, query: Optional[dict] = None) -> list:
+        """
+        Gets all pages of series database from notion api
+
+        Args:
+            query (dict): optional notion query body (filter, sorts)
 
         Returns:
             list: Returns list of series from series database
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            'Content-Type': 'application/json',
-            'Notion-Version': '2022-06-28'
-        }
-        search_response = requests.post(
-            f'https://api.notion.com/v1/databases/{self.db_id}/query', headers=headers)
-        return self.extract_data(search_response.json())
+        ret = list()
+        async for series in self.iter_series(query):
+            ret.extend(series)
+        return ret
@@ -0,0 +1,171 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+import pymongo
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from mongo_series import SeriesQueries
+from release_dates import DEFAULT_CADENCE
+
+
+'''
+ Calendar Structure (series.calendar), one document per release occurrence
+    {
+        "_id": "notion-page-id:2022-07-15",
+        "series_id": "notion-page-id",
+        "name": "Истребитель демонов 2",
+        "season": 2,
+        "type": "Аниме",
+        "date": "2022-07-15" BSON date,
+        "generation": "2022-07-15 10:00:00" BSON date, time of rebuild or update which wrote it
+    }
+
+'''
+
+
+PROJECTION = {'name': 1, 'season': 1, 'type': 1, 'next_serie_date': 1, 'date_release': 1,
+              'cadence': 1, 'hiatus_start': 1, 'hiatus_end': 1}
+
+
+class ReleaseCalendar:
+    def __init__(self, mongo_client: AsyncIOMotorClient, weeks_ahead: int = 6, batch_size: int = 1000,
+                 db_name: str = 'series') -> None:
+        """
+        Materialised release calendar built from series collection at sync time
+
+        Args:
+            mongo_client (AsyncIOMotorClient): shared motor client
+            weeks_ahead (int): weeks from this week monday to precompute, from first day
+                of month when month started before this week
+            batch_size (int): max documents in one mongo bulk write
+            db_name (str): mongo database holding series of one notion database
+        """
+        self.series = mongo_client[db_name]['series']
+        self.db = mongo_client[db_name]['calendar']
+        self.weeks_ahead = weeks_ahead
+        self.batch_size = batch_size
+
+    def window(self) -> Tuple[datetime, datetime]:
+        """
+        Get precomputed interval [this week monday or first day of month if earlier,
+        monday + weeks_ahead - 1 day], so /month sees releases from the 1st
+
+        Returns:
+            Tuple[datetime, datetime]: precomputed interval
+        """
+        monday, _ = SeriesQueries.this_week()
+        first, _ = SeriesQueries.this_month()
+        return (min(monday, first), monday + timedelta(days=7 * self.weeks_ahead - 1))
+
+    @staticmethod
+    def occurrences(serie: dict, start: datetime, end: datetime, today: Optional[date] = None) -> list:
+        """
+        Computes release occurrences of serie on its cadence within [start, end],
+        past occurrences are back-filled only before today, upcoming ones start
+        from next serie date, occurrences within hiatus or after start of open-ended
+        hiatus are skipped
+
+        Args:
+            serie (dict): series document
+            start (datetime): interval start
+            end (datetime): interval end
+            today (date): today date, date.today() by default
+
+        Returns:
+            list: calendar documents
+        """
+        next_date = serie.get('next_serie_date')
+        if next_date is None:
+            return list()
+        today = datetime.combine(today or date.today(), time(0, 0, 0))
+        step = timedelta(days=serie.get('cadence') or DEFAULT_CADENCE)
+        # first cadence step from next serie date which is not before start
+        date_ = next_date + step * -((next_date - start).days // step.days)
+        if serie.get('date_release') is not None and date_ < serie['date_release']:
+            date_ += step * -((date_ - serie['date_release']).days // step.days)
+
+        ret = list()
+        while date_ <= end:
+            if today <= date_ < next_date:
+                # notion has no release between today and next serie date
+                date_ += step
+                continue
+            if serie.get('hiatus_start') is not None and serie['hiatus_start'] <= date_ and \
+                    (serie.get('hiatus_end') is None or date_ <= serie['hiatus_end']):
+                date_ += step
+                continue
+            ret.append({
+                "_id": f"{serie['_id']}:{date_.strftime('%Y-%m-%d')}",
+                "series_id": serie['_id'],
+                "name": serie['name'],
+                "season": serie.get('season'),
+                "type": serie.get('type'),
+                "date": date_,
+            })
+            date_ += step
+        return ret
+
+    @staticmethod
+    def new_generation() -> datetime:
+        """
+        Get generation of calendar write, current time truncated to milliseconds
+        as stored in BSON date, so it compares equal after round trip
+
+        Returns:
+            datetime: generation
+        """
+        now = datetime.now()
+        return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    @staticmethod
+    def stale_query(series_ids: list, keep_ids: list) -> dict:
+        return {'series_id': {'$in': list(series_ids)}, '_id': {'$nin': keep_ids}}
+
+    async def update_series(self, series_ids: list) -> int:
+        """
+        Recomputes occurrences of changed or deleted series only
+
+        Args:
+            series_ids (list): notion page ids
+
+        Returns:
+            int: number of occurrences of these series in calendar
+        """
+        start, end = self.window()
+        generation = self.new_generation()
+        cursor = self.series.find({'_id': {'$in': list(series_ids)}, **SeriesQueries.watched_query()}, PROJECTION)
+        docs = list()
+        async for serie in cursor:
+            docs.extend(self.occurrences(serie, start, end))
+
+        await self.db.delete_many(self.stale_query(series_ids, [doc['_id'] for doc in docs]))
+        if docs:
+            await self.db.bulk_write([pymongo.ReplaceOne({'_id': doc['_id']}, {**doc, 'generation': generation},
+                                                         upsert=True)
+                                      for doc in docs], ordered=False)
+        return len(docs)
+
+    async def rebuild(self) -> int:
+        """
+        Rebuilds calendar for watched series with upserts tagged with generation of this rebuild,
+        then removes occurrences of older generations, collection is never dropped
+
+        Returns:
+            int: number of occurrences in calendar
+        """
+        start, end = self.window()
+        generation = self.new_generation()
+        cursor = self.series.find(SeriesQueries.watched_query(), PROJECTION)
+        docs = list()
+        async for serie in cursor:
+            docs.extend(self.occurrences(serie, start, end))
+
+        for i in range(0, len(docs), self.batch_size):
+            await self.db.bulk_write([pymongo.ReplaceOne({'_id': doc['_id']}, {**doc, 'generation': generation},
+                                                         upsert=True)
+                                      for doc in docs[i:i + self.batch_size]], ordered=False)
+        # filter size does not grow with calendar, documents written before generations are matched too
+        await self.db.delete_many({'generation': {'$not': {'$gte': generation}}})
+        logging.info(f"Rebuilt release calendar with {len(docs)} occurrences")
+        return len(docs)
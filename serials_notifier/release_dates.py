@@ -0,0 +1,99 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # closed form is applied row by row without numpy
+    np = None
+
+
+DEFAULT_CADENCE = 7
+
+CADENCES = {
+    "Каждый день": 1,
+    "Каждую неделю": 7,
+    "Раз в две недели": 14,
+}
+
+
+def parse_cadence(value) -> int:
+    """
+    Transforms notion cadence property to days between releases
+
+    Args:
+        value: select name ("Каждую неделю"), number of days or None
+
+    Returns:
+        int: days between releases, weekly if value is unknown
+    """
+    if value is None:
+        return DEFAULT_CADENCE
+    if isinstance(value, (int, float)):
+        return int(value) if value >= 1 else DEFAULT_CADENCE
+    if value in CADENCES:
+        return CADENCES[value]
+    digits = ''.join(ch for ch in str(value) if ch.isdigit())
+    return int(digits) if digits and int(digits) >= 1 else DEFAULT_CADENCE
+
+
+def next_release(date_release: datetime, today: date, cadence: int = DEFAULT_CADENCE,
+                 hiatus_start: Optional[datetime] = None,
+                 hiatus_end: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Computes first release on cadence grid from release date which is not before today
+    and not within hiatus, in O(1)
+
+    Args:
+        date_release (datetime): first episode date
+        today (date): today date
+        cadence (int): days between releases
+        hiatus_start (datetime): first day without releases
+        hiatus_end (datetime): last day without releases, None if hiatus is open-ended
+
+    Returns:
+        Optional[datetime]: next release date, None if it falls into open-ended hiatus
+    """
+    start = date_release.date()
+    steps = max(0, -((start - today).days // cadence))
+    next_ = start + timedelta(days=steps * cadence)
+    if hiatus_start is not None and hiatus_start.date() <= next_:
+        if hiatus_end is None:
+            return None
+        if next_ <= hiatus_end.date():
+            next_ = start + timedelta(days=((hiatus_end.date() - start).days // cadence + 1) * cadence)
+    return datetime.combine(next_, time(0, 0, 0))
+
+
+def _days(dates: Iterable[Optional[datetime]], missing: int):
+    return np.array([d.toordinal() if d is not None else missing for d in dates], dtype=np.int64)
+
+
+def next_releases(series: list, today: date) -> List[Optional[datetime]]:
+    """
+    Computes next release of every series in one vectorised pass
+
+    Args:
+        series (list): series records with date_release, cadence, hiatus_start and hiatus_end
+        today (date): today date
+
+    Returns:
+        List[Optional[datetime]]: next release dates, None if it falls into open-ended hiatus
+    """
+    if np is None or not series:
+        return [next_release(el.date_release, today, el.cadence or DEFAULT_CADENCE,
+                             el.hiatus_start, el.hiatus_end) for el in series]
+
+    release = _days((el.date_release for el in series), 0)
+    cadence = np.array([el.cadence or DEFAULT_CADENCE for el in series], dtype=np.int64)
+    # series without hiatus get empty interval, open-ended hiatus has no end
+    hiatus_start = _days((el.hiatus_start for el in series), 1)
+    hiatus_end = _days((el.hiatus_end if el.hiatus_start else None for el in series), 0)
+    open_ended = np.array([el.hiatus_start is not None and el.hiatus_end is None for el in series])
+
+    steps = np.maximum(0, -((release - today.toordinal()) // cadence))
+    next_ = release + steps * cadence
+    no_release = open_ended & (next_ >= hiatus_start)
+    in_hiatus = (next_ >= hiatus_start) & (next_ <= hiatus_end)
+    after_hiatus = release + ((hiatus_end - release) // cadence + 1) * cadence
+    next_ = np.where(in_hiatus, after_hiatus, next_)
+    return [None if skip else datetime.fromordinal(int(day)) for day, skip in zip(next_, no_release)]
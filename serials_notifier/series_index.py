@@ -0,0 +1,156 @@
+import heapq
+import math
+import re
+from typing import Dict, FrozenSet, Iterable, List
+
+from notion_series_db import Series
+
+
+'''
+ Name index, one posting set of series ids per trigram of normalized name.
+ Words are padded with two spaces in front and one behind, so "  б", " бр"
+ trigrams match word prefixes and last word of query, which may be typed
+ partially, is padded only in front.
+'''
+
+
+WORD = re.compile(r'\w+')
+EMPTY: FrozenSet[str] = frozenset()
+
+
+def normalize(text: str) -> List[str]:
+    """
+    Splits text into lowercase words, ё is searched as е
+
+    Args:
+        text (str): series name or query
+
+    Returns:
+        List[str]: words
+    """
+    return WORD.findall(text.lower().replace('ё', 'е'))
+
+
+def trigrams(words: List[str], partial_last: bool = False) -> FrozenSet[str]:
+    """
+    Get trigrams of padded words
+
+    Args:
+        words (List[str]): normalized words
+        partial_last (bool): last word is a prefix, its end is not padded
+
+    Returns:
+        FrozenSet[str]: trigrams
+    """
+    grams = set()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if partial_last and i == len(words) - 1 else f"  {word} "
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class SeriesIndex:
+    def __init__(self, min_score: float = 0.5) -> None:
+        """
+        In-memory fuzzy index of series names updated by syncs, so search
+        never queries mongo
+
+        Args:
+            min_score (float): min share of query trigrams found in name, lower finds more typos
+        """
+        self.min_score = min_score
+        self.series: Dict[str, Series] = dict()
+        self._grams: Dict[str, FrozenSet[str]] = dict()
+        self._postings: Dict[str, set] = dict()
+        # set once index was filled from mongo, syncs keep it up to date afterwards
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def _add(self, el: Series) -> None:
+        grams = trigrams(normalize(el.name or ''))
+        self.series[el._id] = el
+        self._grams[el._id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(el._id)
+
+    def _remove(self, serie_id: str) -> None:
+        self.series.pop(serie_id, None)
+        for gram in self._grams.pop(serie_id, ()):
+            ids = self._postings[gram]
+            ids.discard(serie_id)
+            if not ids:
+                del self._postings[gram]
+
+    def update(self, series: Iterable[Series]) -> None:
+        """
+        Adds or replaces series
+
+        Args:
+            series (Iterable[Series]): changed series
+        """
+        for el in series:
+            old = self.series.get(el._id)
+            if old is not None and old.name == el.name:
+                # name trigrams are unchanged, only shown fields are replaced
+                self.series[el._id] = el
+                continue
+            self._remove(el._id)
+            self._add(el)
+
+    def load(self, series: Iterable[Series]) -> None:
+        """
+        Fills index from mongo, series already updated by concurrent sync are kept
+
+        Args:
+            series (Iterable[Series]): all series of database
+        """
+        for el in series:
+            if el._id not in self.series:
+                self._add(el)
+        self.loaded = True
+
+    def remove(self, serie_ids: Iterable[str]) -> None:
+        for serie_id in serie_ids:
+            self._remove(serie_id)
+
+    def retain(self, serie_ids: set) -> None:
+        """
+        Removes series which are not in serie_ids, e.g. not seen during full sync
+
+        Args:
+            serie_ids (set): ids of series to keep
+        """
+        self.remove([serie_id for serie_id in self.series if serie_id not in serie_ids])
+
+    def search(self, query: str, limit: int = 10) -> List[Series]:
+        """
+        Finds series which names contain most trigrams of query,
+        ties are broken by similarity of whole name and name length
+
+        Args:
+            query (str): query, may contain typos and unfinished last word
+            limit (int): max results
+
+        Returns:
+            List[Series]: best matches first
+        """
+        words = normalize(query)
+        if not words:
+            return list()
+        grams = trigrams(words, partial_last=True)
+        # short queries are prefixes, typos are tolerated in longer ones only
+        required = len(grams) if len(grams) <= 3 else math.ceil(self.min_score * len(grams))
+        # match shares required trigrams, so it has one of the rarest len - required + 1
+        postings = sorted((self._postings.get(gram, EMPTY) for gram in grams), key=len)
+        candidates = set().union(*postings[:len(grams) - required + 1])
+
+        scored = list()
+        for serie_id in candidates:
+            name_grams = self._grams[serie_id]
+            count = len(grams & name_grams)
+            if count >= required:
+                scored.append((count / len(grams), count / (len(grams) + len(name_grams) - count),
+                               -len(name_grams), serie_id))
+        return [self.series[item[3]] for item in heapq.nlargest(limit, scored)]
@@ -0,0 +1,420 @@
+import asyncio
+import logging
+import os
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import cached_property
+from typing import FrozenSet, Mapping, Optional
+
+import httpx
+from aiogram import types
+from aiohttp import web
+from broadcast import group_by_text
+from host import Host, Plugin
+from metrics import COMMAND_SECONDS, timed
+from notion_events import NotionEventReceiver, make_events_app
+from tenants import SeriesTenant, Tenants
+from users import UserRegistry, parse_notion_id
+
+
+START_MESSAGE = "Прив =) ! Мои команды: \n\
+\n/today - узнать какие сериалы выходят сегодня\
+\n/tommorow - узнать какие сериалы выходят завтра\
+\n/this_week - узнать какие сериалы выходят на этой неделе\
+\n/next_week - узнать какие сериалы выходят на следующей неделе\
+\n/month - узнать какие сериалы выходят в этом месяце\
+\n/wanted - вывести список сериалов, которые хочу посмотерть\
+\n/digest - сводка по всем спискам сразу\
+\n/find <название> - найти сериал, также можно искать в любом чате через @бота\
+\n/update - обновить базы данных"
+
+
+REGISTER_MESSAGE = "Чтобы пользоваться ботом, подключите свою базу сериалов Notion: \n\
+\n/register <id базы сериалов> [id базы подписок] - подключить базы\
+\n/unregister - отключить базу"
+
+
+# command to view rendered by series reader and cached in digest cache
+VIEWS = ('today', 'tommorow', 'next_week', 'this_week', 'month', 'wanted', 'digest')
+
+# max series shown by /find and inline query
+FIND_LIMIT = 10
+
+
+@dataclass
+class SeriesConfig:
+    my_id: int
+    db_id: str
+    multi_user: bool = False
+    sync_timeout: float = 600
+    # views are marked as stale when last sync is older, e.g. during notion outage
+    stale_after: timedelta = timedelta(hours=3)
+    # notion webhook events receiver is started when port is set, hourly sync stays as reconcile
+    notion_events_port: Optional[int] = None
+    notion_events_path: str = '/notion'
+    notion_webhook_token: Optional[str] = None
+    notion_events_debounce: float = 2
+    # users allowed to /register, every database is read with owner's integration token
+    register_users: FrozenSet[int] = frozenset()
+    # owner's databases, other users can not register them
+    owner_dbs: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> 'SeriesConfig':
+        events_port = env.get('NOTION_EVENTS_PORT')
+        return cls(
+            my_id=int(env['MY_ID']),
+            db_id=env['SERIES_ID'],
+            multi_user=env.get('MULTI_USER', '0') == '1',
+            sync_timeout=float(env.get('SYNC_TIMEOUT', 600)),
+            stale_after=timedelta(seconds=float(env.get('STALE_AFTER', 3 * 3600))),
+            notion_events_port=int(events_port) if events_port else None,
+            notion_events_path=env.get('NOTION_EVENTS_PATH', '/notion'),
+            notion_webhook_token=env.get('NOTION_WEBHOOK_TOKEN'),
+            notion_events_debounce=float(env.get('NOTION_EVENTS_DEBOUNCE', 2)),
+            register_users=frozenset(int(user) for user in env.get('REGISTER_USERS', '').split(',') if user),
+            owner_dbs=frozenset(filter(None, (parse_notion_id(env['SERIES_ID']),
+                                              parse_notion_id(env.get('SUBS_ID', ''))))),
+        )
+
+
+class SeriesPlugin(Plugin):
+    name = 'series'
+
+    def __init__(self, host: Host, env: Mapping[str, str] = os.environ) -> None:
+        """
+        Series notifier, commands show releases of user's series database,
+        digests are sent on schedule and notion is synced to mongo hourly
+
+        Args:
+            host (Host): host with shared clients
+            env (Mapping[str, str]): environment
+        """
+        super().__init__(host, env)
+        self.config = SeriesConfig.from_env(env)
+        self.bot = host.bot
+        self.events_runner: Optional[web.AppRunner] = None
+
+    @cached_property
+    def tenants(self) -> Tenants:
+        # owner's database is kept in legacy series mongo database
+        return Tenants(self.host.notion, self.host.mongo_client, self.config.db_id,
+                       sync_timeout=self.config.sync_timeout)
+
+    @cached_property
+    def users(self) -> UserRegistry:
+        return UserRegistry(self.host.mongo_client)
+
+    @property
+    def handles_updates(self) -> bool:
+        return True
+
+    @property
+    def uses_mongo(self) -> bool:
+        return True
+
+    def setup(self) -> None:
+        dp = self.host.dp
+        dp.register_message_handler(self.send_welcome, commands=['start', 'help'])
+        dp.register_message_handler(self.send_register, commands=['register'])
+        dp.register_message_handler(self.send_unregister, commands=['unregister'])
+        for command in VIEWS:
+            dp.register_message_handler(self.view_handler(command), commands=[command])
+        dp.register_message_handler(self.send_update, commands=['update'])
+        dp.register_message_handler(self.send_find, commands=['find'])
+        dp.register_inline_handler(self.inline_find)
+
+        jobs = self.host.scheduler
+        jobs.daily('morning_digest', '11:30', self.notify_sched)
+        jobs.daily('evening_digest', '20:30', self.notify_sched)
+        jobs.every('update_dbs', timedelta(hours=1), self.update_dbs)
+
+    async def tenant_for(self, user_id: int) -> Optional[SeriesTenant]:
+        """
+        Finds series database of user
+
+        Args:
+            user_id (int): telegram user id
+
+        Returns:
+            Optional[SeriesTenant]: tenant or None if user is not allowed
+        """
+        if user_id == self.config.my_id:
+            return self.tenants.default
+        if self.config.multi_user:
+            user = await self.users.get(user_id)
+            if user is not None and parse_notion_id(user.get('series_db') or '') is not None:
+                return self.tenants.get(user['series_db'])
+        return None
+
+    async def stale_note(self, tenant: SeriesTenant) -> str:
+        """
+        Get note about outdated data if notion was not synced for too long
+
+        Args:
+            tenant (SeriesTenant): tenant
+
+        Returns:
+            str: note, empty if data is fresh
+        """
+        last_sync = await tenant.updater.last_sync()
+        if last_sync is None or datetime.now() - last_sync <= self.config.stale_after:
+            return ''
+        return f"\n\nNotion недоступен, данные на {last_sync.strftime('%d.%m.%Y %H:%M')}"
+
+    async def send_view(self, message: types.Message, command: str) -> None:
+        """
+        Sends rendered view of user's series database
+        """
+        tenant = await self.tenant_for(message.from_user.id)
+        if tenant is not None:
+            text = await tenant.digest_cache.get(command, getattr(tenant.series_db, f'get_{command}'))
+            await self.bot.send_message(message.from_user.id, text=text + await self.stale_note(tenant))
+
+    def view_handler(self, command: str):
+        @timed(COMMAND_SECONDS, command)
+        async def send(message: types.Message):
+            logging.info(f"Triggered /{command} command")
+            await self.send_view(message, command)
+        return send
+
+    @timed(COMMAND_SECONDS, 'start')
+    async def send_welcome(self, message: types.Message):
+        logging.info("Triggered /start or /help command")
+        if await self.tenant_for(message.from_user.id) is not None:
+            await self.bot.send_message(message.from_user.id, f"{START_MESSAGE}")
+        elif self.config.multi_user:
+            await self.bot.send_message(message.from_user.id, f"{REGISTER_MESSAGE}")
+
+    @timed(COMMAND_SECONDS, 'register')
+    async def send_register(self, message: types.Message):
+        if self.config.multi_user:
+            logging.info("Triggered /register command")
+            args = message.get_args().split()
+            if not args:
+                await self.bot.send_message(message.from_user.id, f"{REGISTER_MESSAGE}")
+                return
+            user_id = message.from_user.id
+            if user_id not in self.config.register_users:
+                await self.bot.send_message(user_id, text='Регистрация закрыта, обратитесь к владельцу бота')
+                return
+            db_ids = [parse_notion_id(arg) for arg in args[:2]]
+            if None in db_ids:
+                await self.bot.send_message(user_id, text='Id базы - 32 символа из ссылки на базу в Notion')
+                return
+            for db_id in db_ids:
+                if db_id in self.config.owner_dbs or not await self.database_available(db_id):
+                    await self.bot.send_message(user_id, text=f'Нет доступа к базе {db_id}, '
+                                                              f'подключите к ней интеграцию бота')
+                    return
+            db_id = db_ids[0]
+            await self.users.register(user_id, series_db=db_id, subs_db=db_ids[1] if len(db_ids) > 1 else None)
+            await self.tenants.ensure_indexes(db_id)
+            task = self.tenants.get(db_id).sync_runner.trigger()
+            await self.bot.send_message(message.from_user.id,
+                                        text='База подключена, запущено первое обновление')
+            asyncio.create_task(self.report_sync(message.from_user.id, task))
+
+    async def database_available(self, db_id: str) -> bool:
+        """
+        Checks that integration can read notion database before it is registered
+
+        Args:
+            db_id (str): Notion database id string
+
+        Returns:
+            bool: True if database can be queried
+        """
+        try:
+            result = await self.host.notion.query_database(db_id, {'page_size': 1})
+        except httpx.HTTPError as e:
+            logging.warning(f"Failed to check database {db_id}: {e!r}")
+            return False
+        return result.get('object') == 'list'
+
+    @timed(COMMAND_SECONDS, 'unregister')
+    async def send_unregister(self, message: types.Message):
+        if self.config.multi_user:
+            logging.info("Triggered /unregister command")
+            await self.users.unregister(message.from_user.id)
+            await self.bot.send_message(message.from_user.id, text='База отключена')
+
+    async def report_sync(self, chat_id: int, task: asyncio.Task) -> None:
+        """
+        Sends sync result when background run finishes
+        """
+        await self.bot.send_message(chat_id, text=str(await task))
+
+    @timed(COMMAND_SECONDS, 'update')
+    async def send_update(self, message: types.Message):
+        tenant = await self.tenant_for(message.from_user.id)
+        if tenant is not None:
+            logging.info("Triggered /update command")
+            if tenant.sync_runner.running:
+                text = 'Обновление баз данных уже идёт'
+            else:
+                text = 'Запущен процесс обновления баз данных'
+            task = tenant.sync_runner.trigger()
+            await self.bot.send_message(message.from_user.id, text=text)
+            asyncio.create_task(self.report_sync(message.from_user.id, task))
+
+    async def find(self, tenant: SeriesTenant, query: str) -> list:
+        """
+        Searches series names in memory, index is loaded from mongo on first search only
+
+        Args:
+            tenant (SeriesTenant): tenant
+            query (str): search query
+
+        Returns:
+            list: found series, best matches first
+        """
+        index = await tenant.updater.load_index()
+        return index.search(query, FIND_LIMIT)
+
+    @timed(COMMAND_SECONDS, 'find')
+    async def send_find(self, message: types.Message):
+        tenant = await self.tenant_for(message.from_user.id)
+        if tenant is not None:
+            logging.info("Triggered /find command")
+            query = message.get_args().strip()
+            if not query:
+                await self.bot.send_message(message.from_user.id, text='Напишите название: /find <название>')
+                return
+            found = await self.find(tenant, query)
+            await self.bot.send_message(message.from_user.id, text=tenant.series_db.render_found(found, query))
+
+    @timed(COMMAND_SECONDS, 'inline_find')
+    async def inline_find(self, inline_query: types.InlineQuery):
+        """
+        Answers inline query with found series, selected serie is sent with its description
+        """
+        tenant = await self.tenant_for(inline_query.from_user.id)
+        results = list()
+        if tenant is not None and inline_query.query.strip():
+            for el in await self.find(tenant, inline_query.query):
+                description = tenant.series_db.describe_found(el)
+                results.append(types.InlineQueryResultArticle(
+                    id=el._id, title=el.name, description=description,
+                    input_message_content=types.InputTextMessageContent(f"{el.name} — {description}")))
+        await self.bot.answer_inline_query(inline_query.id, results, cache_time=5, is_personal=True)
+
+    async def series_chats(self) -> dict:
+        """
+        Get chats of every series database
+
+        Returns:
+            dict: notion database id to chat ids
+        """
+        chats = {self.config.db_id: [self.config.my_id]}
+        if self.config.multi_user:
+            for db_id, db_chats in (await self.users.group_by('series_db')).items():
+                if parse_notion_id(db_id) is None:
+                    logging.warning(f"Skipped invalid series database {db_id!r} of chats {db_chats}")
+                    continue
+                chats.setdefault(db_id, []).extend(db_chats)
+        return chats
+
+    async def render_today(self, db_id: str) -> Optional[str]:
+        """
+        Renders today digest of one database, failure of one database does not stop others
+
+        Args:
+            db_id (str): Notion database id string
+
+        Returns:
+            Optional[str]: digest, None if it failed
+        """
+        try:
+            tenant = self.tenants.get(db_id)
+            return await tenant.digest_cache.get('today', tenant.series_db.get_today)
+        except Exception as e:
+            logging.warning(f"Failed to render digest of {db_id}: {e!r}")
+            return None
+
+    async def notify_sched(self) -> None:
+        """
+        Notification job, digest is rendered once per database and identical
+        digests are sent to all their chats at once
+        """
+        logging.info("Triggered scheduled notification command")
+        chats = await self.series_chats()
+        texts = await asyncio.gather(*[self.render_today(db_id) for db_id in chats])
+        rendered = {db_id: text for db_id, text in zip(chats, texts) if text is not None}
+        await self.host.broadcaster.broadcast(group_by_text(rendered, chats))
+
+    async def update_dbs(self) -> None:
+        """
+        Update and Sync DB job
+        """
+        logging.info("Triggered scheduled update command")
+        for db_id in await self.series_chats():
+            try:
+                self.tenants.get(db_id).sync_runner.trigger()
+            except Exception as e:
+                logging.warning(f"Failed to start sync of {db_id}: {e!r}")
+
+    async def start_notion_events(self) -> web.AppRunner:
+        """
+        Serve notion webhook events on separate port in both polling and webhook modes
+        """
+        config = self.config
+        receiver = NotionEventReceiver(self.host.notion, self.tenants, self.series_chats,
+                                       config.notion_webhook_token, debounce=config.notion_events_debounce)
+        runner = web.AppRunner(make_events_app(receiver, config.notion_events_path))
+        await runner.setup()
+        await web.TCPSite(runner, port=config.notion_events_port).start()
+        if config.notion_webhook_token is None:
+            logging.warning("NOTION_WEBHOOK_TOKEN is not set, notion events are rejected "
+                            "until verification token is received and set")
+        logging.info(f"Receiving notion events on port {config.notion_events_port}{config.notion_events_path}")
+        return runner
+
+    async def startup(self) -> None:
+        """
+        Receive notion events on startup
+        """
+        if self.config.notion_events_port:
+            self.events_runner = await self.start_notion_events()
+
+    async def warm_up(self) -> None:
+        """
+        Create indexes and sync every database, warm up waits only for databases
+        never synced before, others are served from mongo while sync runs
+        """
+        db_ids = list(await self.series_chats())
+        first = list()
+        for task in await asyncio.gather(*[self.warm_up_tenant(db_id) for db_id in db_ids]):
+            if task is not None:
+                first.append(task)
+        results = await asyncio.gather(*first)
+        logging.info(f"Syncing {len(db_ids)} series databases, waited for {len(first)} first syncs: "
+                     f"{', '.join(map(str, results))}")
+
+    async def warm_up_tenant(self, db_id: str) -> Optional[asyncio.Task]:
+        """
+        Creates indexes, starts sync and loads name index of one database,
+        failure of one database does not stop others
+
+        Args:
+            db_id (str): Notion database id string
+
+        Returns:
+            Optional[asyncio.Task]: sync to wait for if database was never synced
+        """
+        try:
+            await self.tenants.ensure_indexes(db_id)
+            tenant = self.tenants.get(db_id)
+            never_synced = await tenant.updater.last_sync() is None
+            task = tenant.sync_runner.trigger()
+            # name index is filled while sync runs, /find loads it itself if asked earlier
+            await tenant.updater.load_index()
+        except Exception as e:
+            logging.warning(f"Failed to warm up series database {db_id}: {e!r}")
+            return None
+        return task if never_synced else None
+
+    async def shutdown(self) -> None:
+        if self.events_runner is not None:
+            await self.events_runner.cleanup()
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from metrics import (SYNC_FAILURES, SYNC_LAST_ROWS_CHANGED, SYNC_LAST_SECONDS,
+                     SYNC_ROWS_CHANGED, SYNC_SECONDS)
+from updater_worker import Updater
+
+
+class SyncResult:
+    def __init__(self, duration: float, rows: int = 0, error: Optional[str] = None) -> None:
+        """
+        Outcome of one sync run
+
+        Args:
+            duration (float): run time in seconds
+            rows (int): number of changed mongo documents
+            error (str): error description if run failed
+        """
+        self.duration = duration
+        self.rows = rows
+        self.error = error
+
+    def __str__(self) -> str:
+        if self.error is not None:
+            return f"Обновление не удалось за {self.duration:.1f} с: {self.error}"
+        return f"Обновление завершено за {self.duration:.1f} с, изменено строк: {self.rows}"
+
+
+class SyncRunner:
+    def __init__(self, updater: Updater, timeout: float = 600) -> None:
+        """
+        Runs Updater.update_dates as background task, concurrent triggers
+        join one in-flight run
+
+        Args:
+            updater (Updater): series updater
+            timeout (float): max run time in seconds
+        """
+        self.updater = updater
+        self.timeout = timeout
+        self.last_result: Optional[SyncResult] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def trigger(self) -> asyncio.Task:
+        """
+        Starts sync unless one is already running
+
+        Returns:
+            asyncio.Task: in-flight sync task which result is SyncResult
+        """
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def _run(self) -> SyncResult:
+        start = time.monotonic()
+        try:
+            rows = await asyncio.wait_for(self.updater.update_dates(), self.timeout)
+            result = SyncResult(time.monotonic() - start, rows)
+        except asyncio.TimeoutError:
+            result = SyncResult(time.monotonic() - start,
+                                error=f"превышен таймаут {self.timeout:g} с")
+        except Exception as e:
+            logging.exception("Sync failed")
+            result = SyncResult(time.monotonic() - start, error=repr(e))
+        logging.info(f"Sync finished: {result}")
+        SYNC_SECONDS.observe(result.duration)
+        SYNC_LAST_SECONDS.set(result.duration)
+        if result.error is None:
+            SYNC_ROWS_CHANGED.inc(result.rows)
+            SYNC_LAST_ROWS_CHANGED.set(result.rows)
+        else:
+            SYNC_FAILURES.inc()
+        self.last_result = result
+        return result
@@ -0,0 +1,78 @@
+from typing import Dict
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from digest_cache import DigestCache
+from mongo_indexes import ensure_indexes
+from mongo_series import AsyncSeriesMongo
+from notion_api import NotionClient
+from sync_runner import SyncRunner
+from updater_worker import Updater
+
+
+class SeriesTenant:
+    def __init__(self, notion: NotionClient, db_id: str, mongo_client: AsyncIOMotorClient,
+                 db_name: str, sync_timeout: float) -> None:
+        """
+        Updater, reader, digest cache and sync runner of one notion series database,
+        shared by all users of this database
+
+        Args:
+            notion (NotionClient): shared Notion api client
+            db_id (str): Notion database id string
+            mongo_client (AsyncIOMotorClient): shared motor client
+            db_name (str): mongo database holding series of this notion database
+            sync_timeout (float): max sync run time in seconds
+        """
+        self.db_id = db_id
+        self.db_name = db_name
+        self.updater = Updater(notion, db_id, mongo_client, db_name=db_name)
+        self.series_db = AsyncSeriesMongo(mongo_client, db_name=db_name)
+        self.digest_cache = DigestCache(lambda: self.updater.generation)
+        self.sync_runner = SyncRunner(self.updater, timeout=sync_timeout)
+
+
+class Tenants:
+    def __init__(self, notion: NotionClient, mongo_client: AsyncIOMotorClient, default_db_id: str,
+                 sync_timeout: float = 600) -> None:
+        """
+        Lazily created tenants keyed by notion series database id
+
+        Args:
+            notion (NotionClient): shared Notion api client
+            mongo_client (AsyncIOMotorClient): shared motor client
+            default_db_id (str): owner database, kept in legacy series mongo database
+            sync_timeout (float): max sync run time in seconds
+        """
+        self.notion = notion
+        self.mongo_client = mongo_client
+        self.default_db_id = default_db_id
+        self.sync_timeout = sync_timeout
+        self._tenants: Dict[str, SeriesTenant] = dict()
+
+    def db_name(self, db_id: str) -> str:
+        if db_id == self.default_db_id:
+            return 'series'
+        return f"series_{db_id.replace('-', '')}"
+
+    @property
+    def default(self) -> SeriesTenant:
+        return self.get(self.default_db_id)
+
+    def get(self, db_id: str) -> SeriesTenant:
+        """
+        Returns tenant of notion database, creates it on first use
+
+        Args:
+            db_id (str): Notion database id string
+
+        Returns:
+            SeriesTenant: tenant
+        """
+        if db_id not in self._tenants:
+            self._tenants[db_id] = SeriesTenant(self.notion, db_id, self.mongo_client,
+                                                self.db_name(db_id), self.sync_timeout)
+        return self._tenants[db_id]
+
+    async def ensure_indexes(self, db_id: str) -> None:
+        await ensure_indexes(self.mongo_client, self.db_name(db_id))
@@ -1,15 +1,22 @@
+import asyncio
 import logging
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
 
 import pymongo
-import requests
+from motor.motor_asyncio import AsyncIOMotorClient
 
-from notion_series_db import SeriesNotion
+from mongo_series import SeriesQueries
+from notion_api import NotionClient, WritePipeline
+from notion_series_db import Series, SeriesNotion
+from release_calendar import ReleaseCalendar
+from release_dates import DEFAULT_CADENCE, next_release, next_releases
+from series_index import SeriesIndex
 
 '''
  DB Structure
     {
-        "_id": ObjectId("1234567890"),
+        "_id": "notion-page-id",
         "name": "Истребитель демонов 2",
         "season": 2,
         "status": "Смотрю", ["Смотрю", "Хочу посмотреть", "Просмотренно"]
@@ -17,63 +24,89 @@ from notion_series_db import SeriesNotion
         "next_serie_date": "2022-07-15",
         "is_finished": "Да", ["Нет", "Да"]
         "type": "Аниме", ["Аниме", "Сериал", "Мультсериал"]
+        "cadence": 7, days between episodes
+        "hiatus_start": "2022-08-01" BSON date or null, first day of break
+        "hiatus_end": "2022-08-31" BSON date or null, last day of break, null if break is open-ended
+        "last_edited_time": "2022-07-08T10:00:00.000Z"
+    }
+
+ Sync state (series.sync_state)
+    {
+        "_id": "series",
+        "last_edited_time": "2022-07-08T10:00:00.000Z", high-water mark of synced pages
+        "last_full_sync": "2022-07-08T10:00:00" BSON date,
+        "last_sync": "2022-07-08T10:00:00" BSON date, last successful full or delta sync
     }
 
 '''
 
 
+SYNC_STATE_ID = 'series'
+
+
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s %(levelname)s %(message)s")
 
 
 class Updater:
 
-    def __init__(self, api_key: str, db_id: str, con_string: str) -> None:
+    def __init__(self, notion: NotionClient, db_id: str, mongo_client: AsyncIOMotorClient,
+                 full_sync_every: timedelta = timedelta(hours=24), batch_size: int = 1000,
+                 write_concurrency: int = 3, db_name: str = 'series') -> None:
         """
         Init class
         Args:
-            api_key (str): Notion api key string
+            notion (NotionClient): shared Notion api client
             db_id (str): Notion database id string
-            con_string (str): MongoDB connection string
+            mongo_client (AsyncIOMotorClient): motor client shared with bot
+            full_sync_every (timedelta): how often full reconcile runs instead of delta sync
+            batch_size (int): max documents in one mongo bulk write
+            write_concurrency (int): max notion writes in flight
+            db_name (str): mongo database holding series of this notion database
         """
 
-        self.mongo_client = pymongo.MongoClient(con_string)
-        self.db = self.mongo_client.series['series']
+        self.mongo_client = mongo_client
+        self.db = self.mongo_client[db_name]['series']
+        self.sync_state = self.mongo_client[db_name]['sync_state']
+        self.full_sync_every = full_sync_every
+        self.batch_size = batch_size
 
-        self.api_key = api_key
+        self.notion = notion
         self.db_id = db_id
 
-        self.notion_db = SeriesNotion(self.api_key, self.db_id)
+        self.notion_db = SeriesNotion(self.notion, self.db_id)
+        self.calendar = ReleaseCalendar(
+            self.mongo_client, batch_size=batch_size, db_name=db_name)
+        self.writer = WritePipeline(self.notion, write_concurrency)
+        # series names searched by /find, kept in sync with mongo by every write below
+        self.index = SeriesIndex()
+        self.writes_skipped = 0
+        # bumped after every successful sync, used to invalidate rendered digests
+        self.generation = 0
+        # syncs and webhook event writes never interleave, so delete_stale of full sync
+        # can not remove page created or restored by event during the scan
+        self.lock = asyncio.Lock()
 
     @staticmethod
-    def find_next(date_started: datetime) -> datetime:
+    def find_next(date_started: datetime, cadence: int = DEFAULT_CADENCE) -> datetime:
         """
         Computes new series date based on previous date
         Args:
             date_started (datetime): previous date
+            cadence (int): days between episodes
 
         Returns:
             _type_: new date
         """
+        return next_release(date_started, datetime.today().date(), cadence)
 
-        tmp = date_started.date()
-        while (tmp < datetime.today().date()):
-            tmp += timedelta(days=7)
-        return datetime.combine(tmp, time(0, 0, 0))
-
-    def insert_one(self, data: dict) -> None:
+    async def insert_one(self, data: dict) -> None:
         """
         Inserts one serie into notion database
         Args:
             data (dict): Data to insert
         """
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            'Content-Type': 'application/json',
-            'Notion-Version': '2022-06-28'
-        }
-
         json_data = {
             "parent": {"database_id": self.db_id},
             "properties": dict()
@@ -130,33 +163,39 @@ class Updater:
                                 "name": v,
                             }
                         }
-        res = requests.post(
-            f'https://api.notion.com/v1/pages', headers=headers, json=json_data)
+        res = await self.writer.create_page(json_data)
 
-        if str(res) == '<Response [200]>':
+        if res is not None:
             logging.info(f"Succesfully inserted page and got response {res}")
         else:
-            logging.warning(f"Something went wrong got response {res}")
+            logging.warning("Something went wrong, see notion response above")
 
-    def update_serie_date(self, serie_id: str, old_date: datetime, release_date: datetime) -> None:
+    @staticmethod
+    def is_date_due(el: Series, now: datetime) -> bool:
+        """
+        Checks if next serie date of series should be recomputed
+
+        Args:
+            el (Series): series
+            now (datetime): current time
+
+        Returns:
+            bool: True if release date is known and next serie date is unset or passed
+        """
+        return el.date_release is not None and \
+            (el.next_serie_date is None or el.next_serie_date < now)
+
+    async def update_serie_date(self, serie_id: str, new_date: datetime) -> Optional[datetime]:
         """
         Updates next serie release date
 
         Args:
             serie_id (str): series id in notion db
-            old_date (datetime): series old next serie date
-        """
-        if release_date is None:
-            return None
-        new_date = old_date
-        if old_date < datetime.today():
-            new_date = self.find_next(release_date)
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            'Content-Type': 'application/json',
-            'Notion-Version': '2022-06-28'
-        }
+            new_date (datetime): series new next serie date
+
+        Returns:
+            Optional[datetime]: new next serie date if notion was updated
+        """
         data_to_upd = {
             "properties": {
                 "Следующая серия выйдет": {
@@ -168,61 +207,334 @@ class Updater:
                 }
             }
         }
-        res = requests.patch(
-            f'https://api.notion.com/v1/pages/{serie_id}', headers=headers, json=data_to_upd)
+        res = await self.writer.update_page(serie_id, data_to_upd)
 
-        if str(res) == '<Response [200]>':
+        if res is not None:
             logging.info(f"Succesfully updated date and got response {res}")
-        else:
-            logging.warning(f"Something went wrong got response {res}")
+            return new_date
+        logging.warning("Something went wrong, see notion response above")
+        return None
 
-    def del_one(self, serie_id: str) -> None:
+    async def del_one(self, serie_id: str) -> None:
         """
         Updates serie based on id
         Args:
             data (dict): data to update
             serie_id (str): notion series page id
         """
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            'Content-Type': 'application/json',
-            'Notion-Version': '2022-06-28'
-        }
-        res = requests.delete(
-            f'https://api.notion.com/v1/blocks/{serie_id}', headers=headers)
+        res = await self.writer.delete_block(serie_id)
 
-        if str(res) == '<Response [200]>':
+        if res is not None:
             logging.info(f"Succesfully deleted page and got response {res}")
         else:
-            logging.warning(f"Something went wrong got response {res}")
+            logging.warning("Something went wrong, see notion response above")
+
+    async def get_sync_state(self) -> dict:
+        """
+        Reads sync state from mongo
+
+        Returns:
+            dict: sync state, empty if never synced
+        """
+        return await self.sync_state.find_one({'_id': SYNC_STATE_ID}) or dict()
+
+    async def save_sync_state(self, **state) -> None:
+        """
+        Saves sync state fields to mongo
+        """
+        await self.sync_state.update_one(
+            {'_id': SYNC_STATE_ID}, {'$set': state}, upsert=True)
+
+    async def last_sync(self) -> Optional[datetime]:
+        """
+        Get time of last successful sync, mongo data is a snapshot of notion at that time
+
+        Returns:
+            Optional[datetime]: last sync time, None if never synced
+        """
+        return (await self.get_sync_state()).get('last_sync')
+
+    def is_full_sync_due(self, state: dict) -> bool:
+        """
+        Checks if full reconcile should run instead of delta sync
+
+        Args:
+            state (dict): sync state
+
+        Returns:
+            bool: True if there is no high-water mark or last full sync is too old
+        """
+        if state.get('last_edited_time') is None or state.get('last_full_sync') is None:
+            return True
+        return datetime.now() - state['last_full_sync'] >= self.full_sync_every
+
+    @staticmethod
+    def edited_since(last_edited_time: str) -> dict:
+        """
+        Creates notion query body for pages edited since high-water mark
+
+        Args:
+            last_edited_time (str): high-water mark
+
+        Returns:
+            dict: notion query body
+        """
+        return {
+            "filter": {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": last_edited_time}
+            }
+        }
+
+    @staticmethod
+    def high_water_mark(series: list, prev: Optional[str] = None) -> Optional[str]:
+        """
+        Finds latest last_edited_time among series
+
+        Args:
+            series (list): series from notion
+            prev (str): previous high-water mark
+
+        Returns:
+            Optional[str]: new high-water mark
+        """
+        marks = [el.last_edited_time
+                 for el in series if el.last_edited_time]
+        if prev is not None:
+            marks.append(prev)
+        return max(marks, default=None)
+
+    async def upsert_series(self, series: list) -> int:
+        """
+        Upserts series into mongo keyed on notion page id with batched unordered bulk writes
+
+        Args:
+            series (list): series from notion
+
+        Returns:
+            int: number of inserted or changed documents
+        """
+        changed = 0
+        for i in range(0, len(series), self.batch_size):
+            res = await self.db.bulk_write([pymongo.ReplaceOne({'_id': el._id}, el.to_doc(), upsert=True)
+                                            for el in series[i:i + self.batch_size]], ordered=False)
+            changed += res.upserted_count + res.modified_count
+        self.index.update(series)
+        return changed
+
+    async def delete_stale(self, seen_ids: set) -> int:
+        """
+        Deletes series which were not seen in notion during full sync
+
+        Args:
+            seen_ids (set): notion page ids seen during sync
+
+        Returns:
+            int: number of deleted documents
+        """
+        res = await self.db.delete_many({'_id': {'$nin': list(seen_ids)}})
+        self.index.retain(seen_ids)
+        return res.deleted_count
+
+    async def notion_to_mongo(self, all_ser_notion: Optional[list] = None) -> None:
+        """
+        Upserts data from notion to mongo and removes deleted series,
+        collection is never dropped so readers always see full data
+        Args:
+            all_ser_notion (list): already fetched series, fetched from notion if None
+        """
+        if all_ser_notion is None:
+            all_ser_notion = await self.notion_db.get_series()
+
+        changed = await self.upsert_series(all_ser_notion)
+        deleted = await self.delete_stale({el._id for el in all_ser_notion})
+        logging.info(f"Synced mongo: {changed} changed, {deleted} deleted")
+
+    @classmethod
+    def diff_dates(cls, series: list) -> Tuple[list, int]:
+        """
+        Finds series which next serie date differs from target date,
+        target dates are computed in one batch pass
+
+        Args:
+            series (list): series with notion values
+
+        Returns:
+            Tuple[list, int]: pairs of series and its target date, number of due
+                series which date already equals target date
+        """
+        now = datetime.today()
+        due = [el for el in series if cls.is_date_due(el, now)]
+        changed = list()
+        unchanged = 0
+        for el, new_date in zip(due, next_releases(due, now.date())):
+            # series in open-ended hiatus have no next release, their date is left as is
+            if new_date is None:
+                continue
+            if new_date == el.next_serie_date:
+                unchanged += 1
+            else:
+                changed.append((el, new_date))
+        return changed, unchanged
+
+    async def update_next_dates(self, series: list) -> list:
+        """
+        Updates changed next serie dates concurrently through write pipeline,
+        updated series are changed in place
+
+        Args:
+            series (list): series to update
 
-    def notion_to_mongo(self) -> None:
+        Returns:
+            list: series which were updated in notion
         """
-        Insert new data from notion to mongo
+        changed, unchanged = self.diff_dates(series)
+        self.writes_skipped += unchanged
+        results = await asyncio.gather(*[self.update_serie_date(el._id, new_date)
+                                         for el, new_date in changed])
+        updated = list()
+        for (el, _), new_date in zip(changed, results):
+            if new_date is not None:
+                el.next_serie_date = new_date
+                updated.append(el)
+        return updated
+
+    async def full_sync(self) -> int:
         """
-        self.db.drop()
-        self.db = self.mongo_client.series['series']
+        Updates dates of all series and upserts them into mongo page by page,
+        then removes deleted pages
 
-        all_ser_notion = self.notion_db.get_series()
+        Returns:
+            int: number of changed and deleted mongo documents
+        """
+        logging.info("Running full sync")
+        seen_ids = set()
+        last_edited_time = None
+        changed = 0
+
+        async for series in self.notion_db.iter_series():
+            watched = [el for el in series
+                       if el.is_finished == "Нет" and el.status == 'Смотрю']
+            await self.update_next_dates(watched)
+            changed += await self.upsert_series(series)
+            seen_ids.update(el._id for el in series)
+            last_edited_time = self.high_water_mark(series, last_edited_time)
+
+        deleted = await self.delete_stale(seen_ids)
+        # every series passed through upsert, so name index is complete
+        self.index.loaded = True
+        logging.info(f"Synced mongo: {changed} changed, {deleted} deleted")
+        await self.save_sync_state(last_edited_time=last_edited_time,
+                                   last_full_sync=datetime.now())
+        return changed + deleted
+
+    async def delta_sync(self, last_edited_time: str) -> int:
+        """
+        Syncs only pages edited since high-water mark and updates dates
+        of series which next serie date has passed
 
-        for el in all_ser_notion:
-            del el['_id']
+        Args:
+            last_edited_time (str): high-water mark
 
-        for el in all_ser_notion:
-            self.db.insert_one(el)
+        Returns:
+            int: number of changed mongo documents
+        """
+        changed = await self.notion_db.get_series(self.edited_since(last_edited_time))
+        logging.info(f"Running delta sync, {len(changed)} pages changed")
 
-    def update_dates(self) -> None:
+        rows = await self.upsert_series(changed)
+
+        due = [Series.from_doc(doc) async for doc in self.db.find(SeriesQueries.due_query(datetime.today()))]
+        updated = await self.update_next_dates(due)
+        for el in updated:
+            await self.db.update_one({'_id': el._id}, {
+                                     '$set': {'next_serie_date': el.next_serie_date}})
+            rows += 1
+        self.index.update(updated)
+
+        await self.save_sync_state(
+            last_edited_time=self.high_water_mark(changed, last_edited_time))
+        return rows
+
+    async def sync_pages(self, pages: list) -> int:
         """
-        Update next serie dates
+        Upserts notion pages changed after webhook events, updates their
+        next serie dates and calendar occurrences
+
+        Args:
+            pages (list): notion page objects of this database
+
+        Returns:
+            int: number of changed mongo documents
         """
+        series = self.notion_db.extract_data({"results": pages})
+        watched = [el for el in series
+                   if el.is_finished == "Нет" and el.status == 'Смотрю']
+        async with self.lock:
+            await self.update_next_dates(watched)
+            rows = await self.upsert_series(series)
+            await self.calendar.update_series([el._id for el in series])
+            self.generation += 1
+        logging.info(f"Synced {len(series)} pages from notion events, {rows} changed")
+        return rows
+
+    async def delete_pages(self, page_ids: list) -> int:
+        """
+        Deletes series of pages removed in notion
+
+        Args:
+            page_ids (list): notion page ids
+
+        Returns:
+            int: number of deleted documents
+        """
+        async with self.lock:
+            res = await self.db.delete_many({'_id': {'$in': list(page_ids)}})
+            self.index.remove(page_ids)
+            if res.deleted_count:
+                await self.calendar.update_series(page_ids)
+                self.generation += 1
+                logging.info(f"Deleted {res.deleted_count} pages after notion events")
+        return res.deleted_count
+
+    async def load_index(self) -> SeriesIndex:
+        """
+        Fills name index from mongo once, later syncs update it incrementally
 
-        logging.info("Started update_and_sync function \n\n")
-        all_ser_notion = self.notion_db.get_series()
+        Returns:
+            SeriesIndex: name index
+        """
+        if not self.index.loaded:
+            self.index.load([Series.from_doc(doc) async for doc in self.db.find()])
+            logging.info(f"Loaded {len(self.index)} series into name index")
+        return self.index
 
-        for el in all_ser_notion:
-            if el["is_finished"] == "Нет" and el["status"] == 'Смотрю':
-                self.update_serie_date(
-                    el['_id'], el["next_serie_date"], el["date_release"])
+    async def update_dates(self, full: Optional[bool] = None) -> int:
+        """
+        Update next serie dates, webhook event writes wait until sync finishes
+        Args:
+            full (bool): force full or delta sync, chosen by sync state if None
+
+        Returns:
+            int: number of changed mongo documents
+        """
 
-        self.notion_to_mongo()
-        logging.info("Finished updating and syncing \n\n")
+        async with self.lock:
+            logging.info("Started update_and_sync function \n\n")
+            self.writer.reset()
+            self.writes_skipped = 0
+            state = await self.get_sync_state()
+            if full is None:
+                full = self.is_full_sync_due(state)
+
+            if full:
+                rows = await self.full_sync()
+            else:
+                rows = await self.delta_sync(state['last_edited_time'])
+            await self.calendar.rebuild()
+            await self.save_sync_state(last_sync=datetime.now())
+            logging.info(
+                f"Notion writes: {self.writer.reset()}, {self.writes_skipped} skipped as unchanged")
+            self.generation += 1
+            logging.info("Finished updating and syncing \n\n")
+        return rows
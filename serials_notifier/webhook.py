@@ -0,0 +1,89 @@
+import asyncio
+import hmac
+import logging
+from typing import Awaitable, Callable, List
+
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookHandler:
+    def __init__(self, dp: Dispatcher, secret_token: str) -> None:
+        """
+        Receives telegram updates, acks them at once and handles them in background
+
+        Args:
+            dp (Dispatcher): dispatcher with registered handlers
+            secret_token (str): expected secret token header
+        """
+        if not secret_token:
+            raise ValueError("Webhook secret token is required")
+        self.dp = dp
+        self.secret_token = secret_token
+        self._tasks = set()
+
+    def check_secret(self, request: web.Request) -> bool:
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret_token)
+
+    async def _process(self, update: types.Update) -> None:
+        try:
+            await self.dp.process_update(update)
+        except Exception:
+            logging.exception(f"Failed to handle update {update.update_id}")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        Webhook endpoint, replies before handler runs so telegram never waits
+        for notion or mongo
+        """
+        if not self.check_secret(request):
+            logging.warning("Rejected webhook request with wrong secret token")
+            return web.Response(status=401)
+        try:
+            update = types.Update(**await request.json())
+        except (TypeError, ValueError):
+            # body is not json object
+            return web.Response(status=400)
+
+        # handlers use Bot.get_current(), context is copied into the task
+        Bot.set_current(self.dp.bot)
+        Dispatcher.set_current(self.dp)
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(status=200)
+
+    async def drain(self, _=None) -> None:
+        """
+        Waits for updates in progress, used on shutdown
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def make_webhook_app(dp: Dispatcher, path: str, secret_token: str,
+                     on_startup: List[Callable[[web.Application], Awaitable]] = (),
+                     on_shutdown: List[Callable[[web.Application], Awaitable]] = ()) -> web.Application:
+    """
+    Builds aiohttp application serving telegram webhook
+
+    Args:
+        dp (Dispatcher): dispatcher with registered handlers
+        path (str): webhook path, e.g. /webhook
+        secret_token (str): expected secret token header
+        on_startup (List[Callable]): startup callbacks
+        on_shutdown (List[Callable]): shutdown callbacks, run after pending updates finish
+
+    Returns:
+        web.Application: application
+    """
+    handler = WebhookHandler(dp, secret_token)
+    app = web.Application()
+    app.router.add_post(path, handler.handle)
+    app.on_startup.extend(on_startup)
+    app.on_shutdown.append(handler.drain)
+    app.on_shutdown.extend(on_shutdown)
+    return app
@@ -1,58 +1,183 @@
-import requests
+import json
 import os
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
 
+from notion_api import NotionClient
+from notion_schema import Field, Record, Schema
 
-DB_ID = os.environ['SUBS_ID']
+
+# default database of helpers, plugin reads SUBS_ID when it is created
+DB_ID = os.environ.get('SUBS_ID')
+
+
+# subscription period to months between charges, monthly if unknown
+PERIOD_MONTHS = {
+    "Ежемесячная": 1,
+    "Годовая": 12,
+}
+
+# days before charge when subscription is reported
+LEAD_DAYS = int(os.environ.get('SUBS_LEAD_DAYS', 2))
+
+
+@dataclass(slots=True)
+class Subscription(Record):
+    _id: str
+    name: str
+    type: str
+    price: float
+    total_pay: float
+    duration: str
+    month_pay: float
+    date_activated: Optional[date] = None
+    last_edited_time: Optional[str] = None
+
+
+SUBS_SCHEMA = Schema('subscriptions', Subscription, {
+    "_id": Field("id", 'page', required=True),
+    "name": Field("Подписка", 'title', required=True),
+    "type": Field("Тип", 'select', required=True),
+    "price": Field("Цена", 'number', required=True),
+    "total_pay": Field("Я плочу", 'formula', required=True),
+    "duration": Field("Период", 'select', required=True),
+    "month_pay": Field("Я плочу в месяц", 'formula', required=True),
+    "date_activated": Field("Дата списания", 'date', convert=lambda v: date.fromisoformat(v[:10])),
+    "last_edited_time": Field("last_edited_time", 'page'),
+})
+
+# renamed notion properties, e.g. {"price": "Price"}
+SUBS_EXTRACTOR = SUBS_SCHEMA.with_properties(
+    json.loads(os.environ.get('SUBS_PROPERTIES', '{}'))).compile()
 
 
 def extract_data(req_res):
+    return SUBS_EXTRACTOR.extract(req_res)
+
+
+async def get_subs(notion: NotionClient, db_id: str = DB_ID):
     ret = list()
-    for el in req_res["results"]:
-        tmp = el["properties"]
-        sup = {
-            "name": tmp["Подписка"]["title"][0]["text"]["content"],
-            "type": tmp["Тип"]["select"]["name"],
-            "prcie": tmp["Цена"]["number"],
-            "total_pay": tmp["Я плочу"]["formula"]["number"],
-            "duration": tmp["Период"]["select"]["name"],
-            "month_pay": tmp["Я плочу в месяц"]["formula"]["number"]
-        }
-        try:
-            sup["date_activated"] = tmp["Дата списания"]["date"]["start"]
-        except:
-            sup["date_activated"] = None
-        ret.append(sup)
+    async for page in notion.iter_query(db_id):
+        ret.extend(extract_data(page))
     return ret
 
 
-def get_subs(api_key):
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        'Content-Type': 'application/json',
-        'Notion-Version': '2022-06-28'
-    }
-    search_response = requests.post(
-        f'https://api.notion.com/v1/databases/{DB_ID}/query', headers=headers)
-    return extract_data(search_response.json())
+def add_months(date_: date, months: int) -> date:
+    """
+    Shifts date by months, day is clamped to month length
+
+    Args:
+        date_ (date): date
+        months (int): months to add
+
+    Returns:
+        date: shifted date
+    """
+    month = date_.month - 1 + months
+    year, month = date_.year + month // 12, month % 12 + 1
+    days = (date(year + month // 12, month % 12 + 1, 1) - date(year, month, 1)).days
+    return date(year, month, min(date_.day, days))
+
+
+def next_charge(date_activated: date, duration: str, today: date) -> date:
+    """
+    Rolls charge date forward by whole periods to first charge not before today
+
+    Args:
+        date_activated (date): charge date from notion
+        duration (str): subscription period
+        today (date): today date
 
+    Returns:
+        date: next charge date
+    """
+    if date_activated >= today:
+        return date_activated
+    months = PERIOD_MONTHS.get(duration, 1)
+    periods = ((today.year - date_activated.year) * 12 + today.month - date_activated.month) // months
+    charge = add_months(date_activated, periods * months)
+    if charge < today:
+        charge = add_months(date_activated, (periods + 1) * months)
+    return charge
 
-def notify_subs(api_key):
+
+def due_subs(subs: list, today: date, lead_days: int = LEAD_DAYS) -> list:
+    """
+    Finds subscriptions charged within lead window, charge dates are rolled forward
+
+    Args:
+        subs (list): subscriptions
+        today (date): today date
+        lead_days (int): days before charge
+
+    Returns:
+        list: due subscriptions with next charge date in date_activated, sorted by date
+    """
+    ret = list()
+    for el in subs:
+        if el.date_activated is not None:
+            charge = next_charge(el.date_activated, el.duration, today)
+            if (charge - today).days <= lead_days:
+                ret.append(Subscription(el._id, el.name, el.type, el.price, el.total_pay, el.duration,
+                                        el.month_pay, charge, el.last_edited_time))
+    return sorted(ret, key=lambda el: el.date_activated)
+
+
+def render_subs(subs: list, stale_since: Optional[datetime] = None) -> str:
+    """
+    Renders subscriptions which should be paid soon
+
+    Args:
+        subs (list): due subscriptions with next charge date
+        stale_since (datetime): last sync time if notion was unavailable
+
+    Returns:
+        str: message text
+    """
     text = f"#Подписки \n\nСкоро нужно оплатить следующие подписки:\n\n"
     space = "  "
-    for el in get_subs(api_key):
-        if el["date_activated"] is not None:
-            if (datetime.strptime(
-                    el["date_activated"], "%Y-%m-%d").date() - datetime.today().date()).days <= 2:
-                if el['duration'] == "Годовая":
-                    if el['type'] == "Семейная подписка":
-                        text += f"{space}{el['name']} к оплате {el['price']} руб. до {'-'.join(reversed(el['date_activated'].split('-')))}\n{space}Это семейная годовая подписка, нужно попросить денег с членов семьи"
-                    else:
-                        text += f"{space}{el['name']} к оплате {el['total_pay']} руб. до {'-'.join(reversed(el['date_activated'].split('-')))}\n{space}Это личная годовая подписка"
-                else:
-                    if el['type'] == "Семейная подписка":
-                        text += f"{space}{el['name']} к оплате {el['price']} до {'-'.join(reversed(el['date_activated'].split('-')))}\n{space}Это семейная ежемесячная подписка, нужно попросить денег с членов семьи"
-                    else:
-                        text += f"{space}{el['name']} к оплате {el['total_pay']} руб. до {'-'.join(reversed(el['date_activated'].split('-')))}\n{space}Это личная ежемесячная подписка"
-                text += "\n\n"
+    for el in subs:
+        pay_until = el.date_activated.strftime('%d-%m-%Y')
+        if el.duration == "Годовая":
+            if el.type == "Семейная подписка":
+                text += f"{space}{el.name} к оплате {el.price} руб. до {pay_until}\n{space}Это семейная годовая подписка, нужно попросить денег с членов семьи"
+            else:
+                text += f"{space}{el.name} к оплате {el.total_pay} руб. до {pay_until}\n{space}Это личная годовая подписка"
+        else:
+            if el.type == "Семейная подписка":
+                text += f"{space}{el.name} к оплате {el.price} до {pay_until}\n{space}Это семейная ежемесячная подписка, нужно попросить денег с членов семьи"
+            else:
+                text += f"{space}{el.name} к оплате {el.total_pay} руб. до {pay_until}\n{space}Это личная ежемесячная подписка"
+        text += "\n\n"
+    if stale_since is not None:
+        text += f"Notion недоступен, данные на {stale_since.strftime('%d.%m.%Y %H:%M')}\n"
     return text
+
+
+def render_spend(subs: list) -> str:
+    """
+    Renders monthly spend summary
+
+    Args:
+        subs (list): all subscriptions
+
+    Returns:
+        str: message text
+    """
+    space = "  "
+    total = sum(el.month_pay or 0 for el in subs)
+    text = f"#Подписки \n\nВ месяц на подписки уходит {total:.2f} руб.\n\n"
+    by_type = dict()
+    for el in subs:
+        by_type[el.type] = by_type.get(el.type, 0) + (el.month_pay or 0)
+    for type_, month_pay in sorted(by_type.items(), key=lambda item: -item[1]):
+        text += f"{space}{type_}: {month_pay:.2f} руб.\n"
+    text += "\n"
+    for el in sorted(subs, key=lambda el: -(el.month_pay or 0)):
+        text += f"{space}{el.name} {el.month_pay} руб. в месяц\n"
+    return text
+
+
+async def notify_subs(notion: NotionClient, db_id: str = DB_ID):
+    return render_subs(due_subs(await get_subs(notion, db_id), date.today()))
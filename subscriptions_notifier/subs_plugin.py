@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import cached_property
+from typing import Mapping, Optional
+
+from aiogram import types
+from broadcast import group_by_text
+from host import Host, Plugin
+from manage_subscriptions import LEAD_DAYS, render_spend, render_subs
+from metrics import COMMAND_SECONDS, timed
+from subs_store import SubsStore, SubsSync
+from users import UserRegistry, parse_notion_id
+
+
+# sent instead of empty digest when database was never synced and notion is down
+NO_DATA_MESSAGE = "#Подписки \n\nNotion недоступен, данных ещё нет"
+
+
+@dataclass
+class SubsConfig:
+    my_id: int
+    db_id: str
+    multi_user: bool = False
+    notify_at: str = '09:00'
+    # background sync of local subscriptions store
+    sync_every: timedelta = timedelta(hours=1)
+    # digest is marked as stale when last sync is older, e.g. during notion outage
+    stale_after: timedelta = timedelta(hours=3)
+    # /spend and /due commands, telegram updates are received when enabled
+    commands: bool = False
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> 'SubsConfig':
+        return cls(
+            my_id=int(env['MY_ID']),
+            db_id=env['SUBS_ID'],
+            multi_user=env.get('MULTI_USER', '0') == '1',
+            notify_at=env.get('SUBS_NOTIFY_AT', '09:00'),
+            sync_every=timedelta(seconds=float(env.get('SUBS_SYNC_EVERY', 3600))),
+            stale_after=timedelta(seconds=float(env.get('STALE_AFTER', 3 * 3600))),
+            commands=env.get('SUBS_COMMANDS', '0') == '1',
+        )
+
+
+class SubsPlugin(Plugin):
+    name = 'subs'
+
+    def __init__(self, host: Host, env: Mapping[str, str] = os.environ) -> None:
+        """
+        Subscriptions notifier, daily digest of upcoming charges is rendered
+        from local store which is synced with notion in background
+
+        Args:
+            host (Host): host with shared clients
+            env (Mapping[str, str]): environment
+        """
+        super().__init__(host, env)
+        self.config = SubsConfig.from_env(env)
+        self._bot = host.bot
+        self._syncs = dict()
+        self._sync_tasks = dict()
+
+    @cached_property
+    def _store(self) -> SubsStore:
+        return SubsStore(os.path.join(self.host.state_dir, 'subs.sqlite'))
+
+    @cached_property
+    def _users(self) -> Optional[UserRegistry]:
+        return UserRegistry(self.host.mongo_client) if self.config.multi_user else None
+
+    @property
+    def handles_updates(self) -> bool:
+        return self.config.commands
+
+    @property
+    def uses_mongo(self) -> bool:
+        return self.config.multi_user
+
+    def setup(self) -> None:
+        if self.config.commands:
+            self.host.dp.register_message_handler(self.send_spend, commands=['spend'])
+            self.host.dp.register_message_handler(self.send_due, commands=['due'])
+        logging.info(f"Added job everyday on {self.config.notify_at}")
+        # digest reads local store, notion is synced in background
+        self.host.scheduler.daily('notify_subs', self.config.notify_at, self._notify)
+        self.host.scheduler.every('sync_subs', self.config.sync_every, self._sync_all)
+
+    async def warm_up(self) -> None:
+        """
+        Syncs every database, waits only for databases never synced before
+        """
+        first = list()
+        for db_id in await self._subs_chats():
+            never_synced = self._store.last_sync(db_id) is None
+            task = self._sync(db_id)
+            if never_synced:
+                first.append(task)
+        await asyncio.gather(*first)
+
+    async def _subs_chats(self) -> dict:
+        chats = {self.config.db_id: [self.config.my_id]}
+        if self._users is not None:
+            for db_id, db_chats in (await self._users.group_by('subs_db')).items():
+                if parse_notion_id(db_id) is None:
+                    logging.warning(f"Skipped invalid subscriptions database {db_id!r} of chats {db_chats}")
+                    continue
+                chats.setdefault(db_id, []).extend(db_chats)
+        return chats
+
+    def _sync(self, db_id: str) -> asyncio.Task:
+        """
+        Starts sync of subscriptions database unless one is already running,
+        overlapping runs could move saved high-water mark backwards
+
+        Args:
+            db_id (str): Notion database id string
+
+        Returns:
+            asyncio.Task: in-flight sync task
+        """
+        if db_id not in self._syncs:
+            self._syncs[db_id] = SubsSync(self.host.notion, self._store, db_id)
+        task = self._sync_tasks.get(db_id)
+        if task is None or task.done():
+            task = self._sync_tasks[db_id] = asyncio.create_task(self._run_sync(db_id))
+        return task
+
+    async def _run_sync(self, db_id: str) -> None:
+        try:
+            await self._syncs[db_id].run()
+        except Exception as e:
+            logging.warning(f"Failed to sync subscriptions {db_id}: {e!r}")
+
+    async def _sync_all(self) -> None:
+        await asyncio.gather(*[self._sync(db_id) for db_id in await self._subs_chats()])
+
+    async def _render(self, db_id: str) -> str:
+        if self._store.last_sync(db_id) is None:
+            await self._sync(db_id)
+        last_sync = self._store.last_sync(db_id)
+        if last_sync is None:
+            return NO_DATA_MESSAGE
+        stale = datetime.now() - last_sync > self.config.stale_after
+        return render_subs(self._store.due(db_id, date.today()), last_sync if stale else None)
+
+    async def _notify(self) -> None:
+        chats = await self._subs_chats()
+        texts = await asyncio.gather(*[self._render(db_id) for db_id in chats])
+        await self.host.broadcaster.broadcast(group_by_text(dict(zip(chats, texts)), chats))
+
+    async def _db_for(self, chat_id: int) -> Optional[str]:
+        for db_id, chats in (await self._subs_chats()).items():
+            if chat_id in chats:
+                return db_id
+        return None
+
+    @timed(COMMAND_SECONDS, 'spend')
+    async def send_spend(self, message: types.Message):
+        db_id = await self._db_for(message.chat.id)
+        if db_id is not None:
+            text = render_spend(self._store.all(db_id)) if self._store.last_sync(db_id) else NO_DATA_MESSAGE
+            await self._bot.send_message(message.chat.id, text=text)
+
+    @timed(COMMAND_SECONDS, 'due')
+    async def send_due(self, message: types.Message):
+        db_id = await self._db_for(message.chat.id)
+        if db_id is not None:
+            args = message.get_args().split()
+            days = int(args[0]) if args and args[0].isdigit() else LEAD_DAYS
+            text = render_subs(self._store.due(db_id, date.today(), days)) if self._store.last_sync(db_id) \
+                else NO_DATA_MESSAGE
+            await self._bot.send_message(message.chat.id, text=text)
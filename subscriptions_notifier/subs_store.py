@@ -0,0 +1,208 @@
+import logging
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from manage_subscriptions import LEAD_DAYS, Subscription, extract_data, next_charge
+from notion_api import NotionClient
+
+
+'''
+ Subscriptions table, one row per notion page, indexed by next charge date
+    db_id, page_id, name, type, price, total_pay, duration, month_pay,
+    date_activated  charge date from notion
+    next_charge     date_activated rolled forward to first charge not before today
+    last_edited_time
+
+ Sync state table
+    db_id, last_edited_time (high-water mark), last_full_sync, last_sync
+'''
+
+
+COLUMNS = ('page_id', 'name', 'type', 'price', 'total_pay', 'duration', 'month_pay',
+           'date_activated', 'last_edited_time')
+
+
+class SubsStore:
+    def __init__(self, path: str) -> None:
+        """
+        Local sqlite copy of subscriptions databases answering due date range queries
+
+        Args:
+            path (str): sqlite file, :memory: keeps subscriptions in memory only
+        """
+        self.path = path
+        # queries are index lookups on a small local file, so they run on event loop
+        self.con = sqlite3.connect(path)
+        with self.con:
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute(
+                "CREATE TABLE IF NOT EXISTS subs (db_id TEXT NOT NULL, page_id TEXT NOT NULL, name TEXT, "
+                "type TEXT, price NUMERIC, total_pay NUMERIC, duration TEXT, month_pay NUMERIC, date_activated TEXT, "
+                "next_charge TEXT, last_edited_time TEXT, PRIMARY KEY (db_id, page_id))")
+            self.con.execute("CREATE INDEX IF NOT EXISTS subs_next_charge ON subs (db_id, next_charge)")
+            self.con.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state (db_id TEXT PRIMARY KEY, last_edited_time TEXT, "
+                "last_full_sync TEXT, last_sync TEXT)")
+
+    @staticmethod
+    def _row(db_id: str, el: Subscription, today: date) -> tuple:
+        activated = el.date_activated.isoformat() if el.date_activated is not None else None
+        charge = next_charge(el.date_activated, el.duration, today).isoformat() if activated else None
+        return (db_id, el._id, el.name, el.type, el.price, el.total_pay, el.duration, el.month_pay,
+                activated, charge, el.last_edited_time)
+
+    @staticmethod
+    def _record(row: tuple) -> Subscription:
+        return Subscription(*row[:7], date.fromisoformat(row[7]) if row[7] else None, row[8])
+
+    def upsert(self, db_id: str, subs: List[Subscription], today: date) -> None:
+        """
+        Inserts or replaces subscriptions with their next charge date
+
+        Args:
+            db_id (str): Notion database id string
+            subs (List[Subscription]): subscriptions
+            today (date): today date
+        """
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO subs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [self._row(db_id, el, today) for el in subs])
+
+    def delete_missing(self, db_id: str, seen_ids: set) -> int:
+        """
+        Deletes subscriptions which were not seen in notion during full sync
+
+        Args:
+            db_id (str): Notion database id string
+            seen_ids (set): notion page ids seen during sync
+
+        Returns:
+            int: number of deleted rows
+        """
+        with self.con:
+            stored = {row[0] for row in self.con.execute("SELECT page_id FROM subs WHERE db_id = ?", (db_id,))}
+            stale = [(db_id, page_id) for page_id in stored - seen_ids]
+            self.con.executemany("DELETE FROM subs WHERE db_id = ? AND page_id = ?", stale)
+        return len(stale)
+
+    def roll_forward(self, db_id: str, today: date) -> int:
+        """
+        Moves passed charge dates to next period, only rows before today are touched
+
+        Args:
+            db_id (str): Notion database id string
+            today (date): today date
+
+        Returns:
+            int: number of rolled subscriptions
+        """
+        with self.con:
+            rows = self.con.execute(
+                "SELECT page_id, date_activated, duration FROM subs WHERE db_id = ? AND next_charge < ?",
+                (db_id, today.isoformat())).fetchall()
+            self.con.executemany(
+                "UPDATE subs SET next_charge = ? WHERE db_id = ? AND page_id = ?",
+                [(next_charge(date.fromisoformat(activated), duration, today).isoformat(), db_id, page_id)
+                 for page_id, activated, duration in rows])
+        return len(rows)
+
+    def due(self, db_id: str, today: date, days: int = LEAD_DAYS) -> List[Subscription]:
+        """
+        Get subscriptions charged within [today, today + days] with index range scan
+
+        Args:
+            db_id (str): Notion database id string
+            today (date): today date
+            days (int): lead window in days
+
+        Returns:
+            List[Subscription]: subscriptions with next charge date in date_activated
+        """
+        self.roll_forward(db_id, today)
+        rows = self.con.execute(
+            f"SELECT {', '.join(COLUMNS[:7])}, next_charge, last_edited_time FROM subs "
+            "WHERE db_id = ? AND next_charge BETWEEN ? AND ? ORDER BY next_charge",
+            (db_id, today.isoformat(), (today + timedelta(days=days)).isoformat())).fetchall()
+        return [self._record(row) for row in rows]
+
+    def all(self, db_id: str) -> List[Subscription]:
+        rows = self.con.execute(f"SELECT {', '.join(COLUMNS)} FROM subs WHERE db_id = ?", (db_id,)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def get_sync_state(self, db_id: str) -> dict:
+        row = self.con.execute("SELECT last_edited_time, last_full_sync, last_sync FROM sync_state "
+                               "WHERE db_id = ?", (db_id,)).fetchone()
+        if row is None:
+            return dict()
+        return {'last_edited_time': row[0],
+                'last_full_sync': datetime.fromisoformat(row[1]) if row[1] else None,
+                'last_sync': datetime.fromisoformat(row[2]) if row[2] else None}
+
+    def save_sync_state(self, db_id: str, last_edited_time: Optional[str], full: bool) -> None:
+        now = datetime.now().isoformat()
+        with self.con:
+            self.con.execute(
+                "INSERT INTO sync_state VALUES (?, ?, ?, ?) ON CONFLICT (db_id) DO UPDATE SET "
+                "last_edited_time = excluded.last_edited_time, last_sync = excluded.last_sync, "
+                "last_full_sync = COALESCE(excluded.last_full_sync, last_full_sync)",
+                (db_id, last_edited_time, now if full else None, now))
+
+    def last_sync(self, db_id: str) -> Optional[datetime]:
+        return self.get_sync_state(db_id).get('last_sync')
+
+
+class SubsSync:
+    def __init__(self, notion: NotionClient, store: SubsStore, db_id: str,
+                 full_sync_every: timedelta = timedelta(hours=24)) -> None:
+        """
+        Syncs subscriptions database into local store, pages edited since
+        high-water mark are fetched, full reconcile removes deleted pages
+
+        Args:
+            notion (NotionClient): shared Notion api client
+            store (SubsStore): local store
+            db_id (str): Notion database id string
+            full_sync_every (timedelta): how often full reconcile runs instead of delta sync
+        """
+        self.notion = notion
+        self.store = store
+        self.db_id = db_id
+        self.full_sync_every = full_sync_every
+
+    def is_full_sync_due(self, state: dict) -> bool:
+        if state.get('last_edited_time') is None or state.get('last_full_sync') is None:
+            return True
+        return datetime.now() - state['last_full_sync'] >= self.full_sync_every
+
+    async def run(self, full: Optional[bool] = None) -> int:
+        """
+        Runs delta or full sync
+
+        Args:
+            full (bool): force full or delta sync, chosen by sync state if None
+
+        Returns:
+            int: number of fetched subscriptions
+        """
+        state = self.store.get_sync_state(self.db_id)
+        if full is None:
+            full = self.is_full_sync_due(state)
+        body = None
+        if not full:
+            body = {"filter": {"timestamp": "last_edited_time",
+                               "last_edited_time": {"on_or_after": state['last_edited_time']}}}
+
+        subs = list()
+        async for page in self.notion.iter_query(self.db_id, body):
+            subs.extend(extract_data(page))
+        self.store.upsert(self.db_id, subs, date.today())
+        deleted = self.store.delete_missing(self.db_id, {el._id for el in subs}) if full else 0
+
+        marks = [el.last_edited_time for el in subs if el.last_edited_time]
+        if state.get('last_edited_time') and not full:
+            marks.append(state['last_edited_time'])
+        self.store.save_sync_state(self.db_id, max(marks, default=state.get('last_edited_time')), full)
+        logging.info(f"Synced subscriptions {self.db_id}: {'full' if full else 'delta'}, "
+                     f"{len(subs)} fetched, {deleted} deleted")
+        return len(subs)
@@ -0,0 +1,43 @@
+import os
+from datetime import timedelta
+
+import pymongo
+import pytest
+from pymongo.errors import PyMongoError
+
+from mongo_indexes import assert_no_collscan
+from mongo_series import SeriesMongo
+
+
+DB_NAME = 'series_query_plans_test'
+
+
+@pytest.fixture
+def series_db():
+    """
+    Series db in separate mongo database of CON_STRING or local mongo, test is skipped if mongo is unavailable
+    """
+    client = pymongo.MongoClient(os.environ.get('CON_STRING', 'mongodb://localhost:27017'),
+                                 serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"mongo is unavailable: {e!r}")
+    series_db = SeriesMongo(mongo_client=client, db_name=DB_NAME)
+    today = series_db.today()
+    series_db.db.insert_many([
+        {'_id': f'serie-{i}', 'name': f'Сериал {i}', 'status': ['Смотрю', 'Хочу посмотреть', 'Посмотрел'][i % 3],
+         'is_finished': 'Нет', 'next_serie_date': today + timedelta(days=i % 30), 'date_release': today}
+        for i in range(300)])
+    series_db.calendar.insert_many([
+        {'_id': f'serie-{i}:{i % 40}', 'series_id': f'serie-{i}', 'name': f'Сериал {i}',
+         'date': today + timedelta(days=i % 40)}
+        for i in range(300)])
+    yield series_db
+    client.drop_database(DB_NAME)
+    client.close()
+
+
+def test_queries_use_indexes(series_db):
+    assert_no_collscan(series_db)
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from mongo_series import AsyncSeriesMongo
+from release_calendar import ReleaseCalendar
+
+
+@pytest.fixture
+def mongo_client():
+    return AsyncMongoMockClient()
+
+
+def insert_serie(mongo_client, **serie) -> None:
+    doc = {'status': 'Смотрю', 'is_finished': 'Нет', 'season': 1, 'type': 'Сериал', **serie}
+    asyncio.run(mongo_client.series['series'].insert_one(doc))
+
+
+def test_month_lists_releases_from_first_day(mongo_client):
+    first, last = AsyncSeriesMongo.this_month()
+    today = AsyncSeriesMongo.today()
+    # weekly serie released on the 1st, next serie is the first weekly date from today
+    next_date = first + timedelta(days=7 * -(-(today - first).days // 7))
+    insert_serie(mongo_client, _id='weekly', name='Еженедельный', date_release=first,
+                 next_serie_date=next_date, cadence=7)
+
+    asyncio.run(ReleaseCalendar(mongo_client).rebuild())
+    text = asyncio.run(AsyncSeriesMongo(mongo_client).get_month())
+
+    assert f"{first.strftime('%d.%m')} Еженедельный" in text
+    date_ = first
+    while date_ <= last:
+        assert (f"{date_.strftime('%d.%m')} Еженедельный" in text) == ((date_ - first).days % 7 == 0)
+        date_ += timedelta(days=1)
+
+
+def test_digest_matches_view_commands(mongo_client):
+    today = AsyncSeriesMongo.today()
+    insert_serie(mongo_client, _id='daily', name='Ежедневный', date_release=today - timedelta(days=20),
+                 next_serie_date=today, cadence=1)
+    insert_serie(mongo_client, _id='weekly', name='Еженедельный', date_release=today - timedelta(days=12),
+                 next_serie_date=today + timedelta(days=2), cadence=7)
+    insert_serie(mongo_client, _id='wanted', name='Ожидаемый', status='Хочу посмотреть',
+                 date_release=today + timedelta(days=30))
+
+    asyncio.run(ReleaseCalendar(mongo_client).rebuild())
+    series_db = AsyncSeriesMongo(mongo_client)
+
+    async def views():
+        return [await getattr(series_db, f'get_{command}')()
+                for command in ('today', 'tommorow', 'this_week', 'next_week', 'wanted', 'digest')]
+
+    *texts, digest = asyncio.run(views())
+    assert digest == "\n\n".join(texts)
+
+
+def test_rebuild_removes_older_generations(mongo_client):
+    today = AsyncSeriesMongo.today()
+    calendar = mongo_client.series['calendar']
+    asyncio.run(calendar.insert_one({'_id': 'deleted:2022-07-15', 'series_id': 'deleted', 'name': 'Удалённый',
+                                     'date': today}))
+    insert_serie(mongo_client, _id='weekly', name='Еженедельный', date_release=today - timedelta(days=14),
+                 next_serie_date=today, cadence=7)
+
+    count = asyncio.run(ReleaseCalendar(mongo_client).rebuild())
+    ids = asyncio.run(calendar.distinct('series_id'))
+
+    assert ids == ['weekly']
+    assert asyncio.run(calendar.count_documents({})) == count